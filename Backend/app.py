@@ -1,12 +1,31 @@
+import logging
+import os
 from flask import Flask
 from storage.db import init_db
 from controllers.auth import auth_bp
-from controllers.processor import processor_bp
+from controllers.uploads import UploadRequest, MAX_UPLOAD_BYTES
 from controllers.documents import documents_bp
+from controllers.model_registry import preload
+from controllers.metrics import metrics_bp
+from storage.vectors import get_vector_index
 from flask_cors import CORS # Import CORS
 
-def create_app():
+# PRISMATA_LOG_LEVEL=DEBUG also logs per-document progress and text excerpts
+LOG_LEVEL = os.environ.get('PRISMATA_LOG_LEVEL', 'INFO').upper()
+
+def create_app(preload_models=None, processing=None):
+    """
+    processing=False (or PRISMATA_PROCESSING=0) starts without the /process
+    blueprint and the job queue, so the pipeline and its model/OCR imports are
+    never loaded; such a process only serves auth, documents and metrics.
+    """
     app = Flask(__name__)
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    if preload_models is None:
+        preload_models = os.environ.get('PRISMATA_PRELOAD_MODELS', '0') == '1'
+    if processing is None:
+        processing = os.environ.get('PRISMATA_PROCESSING', '1') == '1'
     
     # Configure CORS to allow requests from frontend
     CORS(app, 
@@ -17,13 +36,31 @@ def create_app():
     
     app.secret_key = 'your-secret-key'  # Change in production!
 
+    # Uploads stream to disk while being hashed; oversized bodies are refused
+    # from Content-Length before any of it is read (plus room for form fields)
+    app.request_class = UploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+
     # Initialize database (creates tables if not exists)
     init_db()
+    # Memory-maps the semantic search index; nothing is read into RAM yet
+    get_vector_index().load()
 
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(processor_bp, url_prefix='/process')
     app.register_blueprint(documents_bp, url_prefix='/documents')
+    app.register_blueprint(metrics_bp)
+
+    if processing:
+        # Imported here: these pull in the pipeline
+        from controllers.processor import processor_bp
+        from controllers.jobs import recover_jobs
+        recover_jobs()
+        app.register_blueprint(processor_bp, url_prefix='/process')
+
+        # Warm the shared models before the first upload instead of on it
+        if preload_models:
+            preload()
 
     return app
 
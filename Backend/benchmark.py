@@ -0,0 +1,413 @@
+"""
+Offline benchmark of the processing pipeline (no server needed).
+
+    python benchmark.py                                  # uploads/ + synthetic PDFs
+    python benchmark.py --save-baseline                  # record benchmarks/baseline.json
+    python benchmark.py --compare --threshold 0.15       # exit 1 on a >15% regression
+    python benchmark.py --startup                        # app start-up time and memory
+
+Each PDF is run through extract_text_from_pdf, detect_language, summarize and
+classify_text. The same inputs are used every time:
+ - the PDFs in uploads/
+ - a generated large text PDF
+ - a generated scanned (image-only) PDF
+Synthetic text comes from a fixed seed and there is one untimed warm-up pass.
+
+The report gives per-stage latency percentiles, extraction pages/s, peak RSS
+and model load time. It is written to --output as JSON. With --compare, every
+metric is checked against the baseline and the run fails if any of them is
+worse by more than --threshold (relative).
+
+--startup instead measures create_app() in fresh interpreters, with and
+without the processing blueprint: time until the app is built, time to
+answer a first /auth/login, peak RSS and which heavy modules got imported.
+It has its own baseline (benchmarks/startup-baseline.json).
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from cli import setup_logging
+from controllers.pipeline import (
+    extract_text_from_pdf, detect_language, classify_text, PdfReader
+)
+from controllers.model_registry import get_llm, model_stats
+
+# --- Optional imports ---
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "latest.json")
+DEFAULT_STARTUP_BASELINE = os.path.join(BENCHMARK_DIR, "startup-baseline.json")
+DEFAULT_STARTUP_OUTPUT = os.path.join(BENCHMARK_DIR, "startup-latest.json")
+STAGES = ("extract", "detect", "summarize", "classify")
+PERCENTILES = (50, 90, 99)
+SEED = 1234
+# Latencies this small are timer noise; they are not compared
+NOISE_FLOOR_SECONDS = 0.005
+
+WORDS = (
+    "circular office employees department payment invoice safety inspection schedule "
+    "procurement tender vendor contract budget approval leave policy training audit "
+    "maintenance operations shift report quarterly notice compliance purchase order"
+).split()
+
+
+# --- Synthetic inputs ---
+def _sentences(rng, count):
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(8, 16))
+        yield " ".join(words).capitalize() + "."
+
+
+def write_text_pdf(path, pages, lines_per_page=45, seed=SEED):
+    """Minimal multi-page PDF with a real text layer (Helvetica, no dependencies)."""
+    rng = random.Random(seed)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 2 * pages + 1
+    page_ids = []
+    for _ in range(pages):
+        lines = [s.replace("\\", "").replace("(", "").replace(")", "") for s in _sentences(rng, lines_per_page)]
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream.encode()))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, catalog, xref))
+
+
+def write_scanned_pdf(path, pages, seed=SEED):
+    """Image-only PDF (no text layer), so extraction has to OCR it. Needs Pillow."""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(pages):
+        image = Image.new("L", (1240, 1754), color=255)
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(_sentences(rng, 40)):
+            draw.text((80, 80 + row * 40), line, fill=0)
+        images.append(image)
+    images[0].save(path, "PDF", resolution=150, save_all=True, append_images=images[1:])
+
+
+def collect_inputs(sources, workdir, large_pages, scanned_pages):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(glob.glob(os.path.join(source, "*.pdf"))))
+        else:
+            paths.append(source)
+    if large_pages:
+        path = os.path.join(workdir, "synthetic-large.pdf")
+        write_text_pdf(path, large_pages)
+        paths.append(path)
+    if scanned_pages:
+        if Image is None:
+            print(">> Pillow not installed -> skipping the synthetic scanned PDF.")
+        else:
+            path = os.path.join(workdir, "synthetic-scanned.pdf")
+            write_scanned_pdf(path, scanned_pages)
+            paths.append(path)
+    return paths
+
+
+# --- Measurement ---
+def peak_rss_mb():
+    if resource:
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if psutil:
+        # Current rather than peak RSS, sampled at the end of the run
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    return None
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def page_count(path):
+    try:
+        return len(PdfReader(path).pages)
+    except Exception:
+        return 0
+
+
+def run_document(path, llm, timings):
+    start = time.perf_counter()
+    text = extract_text_from_pdf(path)
+    timings["extract"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    detect_language(text)
+    timings["detect"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    llm.summarize(text)
+    timings["summarize"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    classify_text(text, llm=llm)
+    timings["classify"].append(time.perf_counter() - start)
+
+
+def run_benchmark(paths, repeat):
+    start = time.perf_counter()
+    llm = get_llm()
+    first_use_seconds = time.perf_counter() - start
+
+    pages = {path: page_count(path) for path in paths}
+    # Warm-up: first-call costs (tokenizer caches, OCR binaries, page cache)
+    for path in paths:
+        run_document(path, llm, {stage: [] for stage in STAGES})
+
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        for path in paths:
+            run_document(path, llm, timings)
+
+    extract_seconds = sum(timings["extract"])
+    rss = peak_rss_mb()
+    return {
+        "documents": [os.path.basename(p) for p in paths],
+        "pages": sum(pages.values()),
+        "repeat": repeat,
+        "stages": {
+            stage: {
+                **{f"p{p}": round(percentile(values, p), 5) for p in PERCENTILES},
+                "mean": round(sum(values) / len(values), 5),
+            }
+            for stage, values in timings.items()
+        },
+        "extract_pages_per_second": round(sum(pages.values()) * repeat / extract_seconds, 2)
+                                    if extract_seconds else None,
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "model_load_seconds": {name: s["load_seconds"] for name, s in model_stats().items()},
+        "first_model_use_seconds": round(first_use_seconds, 3),
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+    }
+
+
+# --- Start-up ---
+HEAVY_MODULES = ("controllers.pipeline", "transformers", "torch", "pytesseract", "pdf2image", "langdetect")
+STARTUP_MODES = {"full": True, "no-processing": False}
+
+# Runs in a fresh interpreter; prints one JSON line
+STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import storage.db
+storage.db.DB_NAME = sys.argv[1]
+from app import create_app
+app = create_app(preload_models=False, processing=sys.argv[2] == "1")
+ready = time.perf_counter() - start
+app.test_client().post("/auth/login", json={"username": "benchmark", "password": "benchmark"})
+print(json.dumps({
+    "ready_seconds": ready,
+    "first_request_seconds": time.perf_counter() - start,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [m for m in json.loads(sys.argv[3]) if m in sys.modules],
+}))
+"""
+
+
+def run_startup_benchmark(repeat):
+    """Median start-up figures per mode, each from `repeat` fresh processes."""
+    if resource is None:
+        raise SystemExit("--startup needs the resource module (POSIX).")
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PRISMATA_LOG_LEVEL": "WARNING"}
+    env.pop("PRISMATA_MODEL_SERVER_URL", None)
+    modes = {}
+    with tempfile.TemporaryDirectory(prefix="prismata-startup-") as workdir:
+        for mode, processing in STARTUP_MODES.items():
+            runs = []
+            for i in range(repeat):
+                # A fresh database per run, so no run benefits from another's files
+                db_path = os.path.join(workdir, f"{mode}-{i}.db")
+                start = time.perf_counter()
+                out = subprocess.run(
+                    [sys.executable, "-c", STARTUP_PROBE, db_path, "1" if processing else "0",
+                     json.dumps(HEAVY_MODULES)],
+                    cwd=backend_dir, env=env, capture_output=True, text=True, check=True
+                )
+                run = json.loads(out.stdout.strip().splitlines()[-1])
+                run["process_seconds"] = time.perf_counter() - start
+                runs.append(run)
+            modes[mode] = {
+                key: round(percentile([r[key] for r in runs], 50), 3)
+                for key in ("ready_seconds", "first_request_seconds", "process_seconds", "rss_mb")
+            }
+            modes[mode]["heavy_modules"] = runs[-1]["heavy_modules"]
+    return {
+        "startup": modes,
+        "repeat": repeat,
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+    }
+
+
+def print_startup_report(report):
+    print(f"\n=== start-up, median of {report['repeat']} processes ===")
+    print(f"{'mode':>14} {'ready':>9} {'1st req':>9} {'process':>9} {'RSS':>9}  heavy modules")
+    for mode, r in report["startup"].items():
+        print(f"{mode:>14} {r['ready_seconds'] * 1000:>7.0f}ms {r['first_request_seconds'] * 1000:>7.0f}ms "
+              f"{r['process_seconds'] * 1000:>7.0f}ms {r['rss_mb']:>7.1f}MB  {', '.join(r['heavy_modules']) or '-'}")
+
+
+# --- Baseline comparison ---
+def comparable_metrics(report):
+    """{name: (value, higher_is_better)} for every metric that is compared."""
+    metrics = {}
+    for mode, stats in report.get("startup", {}).items():
+        for key in ("ready_seconds", "first_request_seconds", "rss_mb"):
+            metrics[f"startup.{mode}.{key}"] = (stats[key], False)
+    for stage, stats in report.get("stages", {}).items():
+        for key, value in stats.items():
+            metrics[f"stages.{stage}.{key}"] = (value, False)
+    if report.get("extract_pages_per_second"):
+        metrics["extract_pages_per_second"] = (report["extract_pages_per_second"], True)
+    if report.get("peak_rss_mb"):
+        metrics["peak_rss_mb"] = (report["peak_rss_mb"], False)
+    for name, seconds in report.get("model_load_seconds", {}).items():
+        metrics[f"model_load_seconds.{name}"] = (seconds, False)
+    return metrics
+
+
+def compare(report, baseline, threshold):
+    """[(metric, baseline, current, relative change)] for every regression."""
+    regressions = []
+    current = comparable_metrics(report)
+    for name, (old, higher_is_better) in comparable_metrics(baseline).items():
+        if name not in current or not old:
+            continue
+        new = current[name][0]
+        if not higher_is_better and (name.startswith("stages.") or name.startswith("model_load")) \
+                and max(old, new) < NOISE_FLOOR_SECONDS:
+            continue
+        change = (new - old) / old
+        if (change < -threshold) if higher_is_better else (change > threshold):
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def print_report(report):
+    print(f"\n=== {len(report['documents'])} documents, {report['pages']} pages, x{report['repeat']} ===")
+    print(f"{'stage':>10} " + " ".join(f"{'p' + str(p):>9}" for p in PERCENTILES) + f" {'mean':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:>10} " + " ".join(f"{stats['p' + str(p)] * 1000:>7.1f}ms" for p in PERCENTILES)
+              + f" {stats['mean'] * 1000:>7.1f}ms")
+    print(f"extract pages/s: {report['extract_pages_per_second']}")
+    print(f"peak RSS: {report['peak_rss_mb']} MB")
+    print(f"model load: {report['model_load_seconds']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="*", default=["uploads"], help="PDF files or directories")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the inputs")
+    parser.add_argument("--large-pages", type=int, default=200, help="Pages of the synthetic text PDF (0 = none)")
+    parser.add_argument("--scanned-pages", type=int, default=3, help="Pages of the synthetic scanned PDF (0 = none)")
+    parser.add_argument("--startup", action="store_true", help="Benchmark app start-up instead of the pipeline")
+    parser.add_argument("--output", help="Where to write this run's JSON report (default: benchmarks/)")
+    parser.add_argument("--baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store this run as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail if a metric regressed against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args()
+    setup_logging()
+
+    if args.startup:
+        args.output = args.output or DEFAULT_STARTUP_OUTPUT
+        args.baseline = args.baseline or DEFAULT_STARTUP_BASELINE
+        report = run_startup_benchmark(max(1, args.repeat))
+        print_startup_report(report)
+    else:
+        args.output = args.output or DEFAULT_OUTPUT
+        args.baseline = args.baseline or DEFAULT_BASELINE
+        with tempfile.TemporaryDirectory(prefix="prismata-bench-") as workdir:
+            paths = collect_inputs(args.sources, workdir, args.large_pages, args.scanned_pages)
+            if not paths:
+                raise SystemExit("No PDFs to benchmark.")
+            report = run_benchmark(paths, max(1, args.repeat))
+        print_report(report)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n>> Report written to {args.output}")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f">> Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            raise SystemExit(f"No baseline at {args.baseline}; run with --save-baseline first.")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("documents") != report.get("documents"):
+            print(">> Warning: baseline was recorded on a different set of documents.")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n>> {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}:")
+            for name, old, new, change in regressions:
+                print(f"   {name}: {old} -> {new} ({change:+.0%})")
+            sys.exit(1)
+        print(f"\n>> No regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
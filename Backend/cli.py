@@ -0,0 +1,40 @@
+"""
+Helpers shared by the command-line tools (ingest, reprocess, benchmark and
+the compare_* reports).
+"""
+
+import glob
+import logging
+import os
+import re
+from collections import Counter
+
+
+def setup_logging(default_level="WARNING"):
+    """
+    Plain message logging for a CLI. Per-document pipeline logging stays off
+    unless PRISMATA_LOG_LEVEL asks for it (e.g. PRISMATA_LOG_LEVEL=INFO).
+    """
+    logging.basicConfig(level=os.environ.get("PRISMATA_LOG_LEVEL", default_level).upper(), format="%(message)s")
+
+
+def collect_pdf_paths(sources):
+    """PDF paths from files and directories (searched recursively), in a stable order."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(glob.glob(os.path.join(source, "**", "*.pdf"), recursive=True)))
+        else:
+            paths.append(source)
+    return paths
+
+
+def word_f1(candidate, reference):
+    """Word-level (ROUGE-1) F1 of two texts; 1.0 when both are empty."""
+    cand = Counter(re.findall(r"\w+", candidate.lower()))
+    ref = Counter(re.findall(r"\w+", reference.lower()))
+    overlap = sum((cand & ref).values())
+    if not overlap:
+        return 1.0 if not cand and not ref else 0.0
+    precision, recall = overlap / sum(cand.values()), overlap / sum(ref.values())
+    return 2 * precision * recall / (precision + recall)
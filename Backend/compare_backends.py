@@ -0,0 +1,106 @@
+"""
+Accuracy / latency comparison of the flan-t5 inference backends.
+
+    python compare_backends.py                      # every PDF in uploads/
+    python compare_backends.py docs/ --backends torch int8 --json backends.json
+
+Every backend summarizes and label-scores the same extracted texts. The first
+backend listed (torch by default) is the reference. For each other backend
+the report gives:
+ - how often its department label agrees with the reference
+ - the ROUGE-1 F1 of its summaries against the reference summaries
+ - its load time and per-document latency
+"""
+
+import argparse
+import json
+import os
+import time
+
+from cli import collect_pdf_paths, setup_logging, word_f1
+from controllers.pipeline import (
+    LocalLLM, extract_text_from_pdf, _classification_prompt, DEPARTMENTS, INFERENCE_BACKENDS
+)
+
+
+def run_backend(backend, texts):
+    start = time.perf_counter()
+    llm = LocalLLM(backend=backend)
+    load_seconds = time.perf_counter() - start
+    if not llm.loaded:
+        return None
+
+    summaries, labels, summarize_seconds, classify_seconds = [], [], 0.0, 0.0
+    for text in texts:
+        start = time.perf_counter()
+        summaries.append(llm.summarize(text))
+        summarize_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        probs = llm.score_labels([_classification_prompt(text)], DEPARTMENTS, batch_size=1)[0]
+        classify_seconds += time.perf_counter() - start
+        labels.append(DEPARTMENTS[int(probs.argmax())])
+
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "summarize_ms_per_doc": round(1000 * summarize_seconds / len(texts), 1),
+        "classify_ms_per_doc": round(1000 * classify_seconds / len(texts), 1),
+        "summaries": summaries,
+        "labels": labels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="*", default=["uploads"], help="PDF files or directories")
+    parser.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS), choices=INFERENCE_BACKENDS)
+    parser.add_argument("--max-chars", type=int, default=4000,
+                        help="Truncate each text so long PDFs don't dominate the run (0 = no limit)")
+    parser.add_argument("--json", help="Also write the full report (including outputs) to this file")
+    args = parser.parse_args()
+    setup_logging()
+
+    texts, names = [], []
+    for path in collect_pdf_paths(args.sources):
+        text = extract_text_from_pdf(path).strip()
+        if text:
+            texts.append(text[:args.max_chars] if args.max_chars else text)
+            names.append(os.path.basename(path))
+    if not texts:
+        raise SystemExit("No PDFs with extractable text found.")
+    print(f">> Comparing {args.backends} on {len(texts)} documents")
+
+    results = {}
+    for backend in args.backends:
+        print(f"\n>> Backend: {backend}")
+        result = run_backend(backend, texts)
+        if result is None:
+            print(f"   {backend} unavailable, skipped.")
+            continue
+        results[backend] = result
+
+    if not results:
+        raise SystemExit("No backend could be loaded.")
+    reference_name = next(iter(results))
+    reference = results[reference_name]
+    for result in results.values():
+        agree = sum(a == b for a, b in zip(result["labels"], reference["labels"]))
+        result["label_agreement"] = round(agree / len(texts), 3)
+        result["summary_rouge1"] = round(
+            sum(word_f1(a, b) for a, b in zip(result["summaries"], reference["summaries"])) / len(texts), 3
+        )
+
+    print(f"\n{'backend':<8} {'load s':>8} {'summ ms/doc':>12} {'class ms/doc':>13} "
+          f"{'labels = ' + reference_name:>16} {'ROUGE-1':>8}")
+    for backend, r in results.items():
+        print(f"{backend:<8} {r['load_seconds']:>8} {r['summarize_ms_per_doc']:>12} "
+              f"{r['classify_ms_per_doc']:>13} {r['label_agreement']:>16} {r['summary_rouge1']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"documents": names, "reference": reference_name, "backends": results}, f, indent=2)
+        print(f"\n>> Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
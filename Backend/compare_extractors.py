@@ -0,0 +1,102 @@
+"""
+Speed / text-quality comparison of the PDF extraction engines.
+
+    python compare_extractors.py                      # every PDF in uploads/
+    python compare_extractors.py docs/ --engines pymupdf pypdf2 --workers 4 --json engines.json
+
+Every installed engine extracts every page of the same PDFs on its own (no
+fallback to another engine). The first engine listed is the reference. For
+each engine the report gives:
+ - pages/s and the slowest page
+ - pages that failed or timed out, and pages with no text
+ - the share of "junk" characters (replacement and control characters)
+ - the word-level F1 of its text against the reference engine's text
+There is no ground truth here: agreement with the reference and low junk
+are proxies for quality, so read them alongside a look at the outputs.
+"""
+
+import argparse
+import json
+import time
+import unicodedata
+
+from cli import collect_pdf_paths, setup_logging, word_f1
+from controllers.extraction import ENGINES, EXTRACTION_ENGINES, available_engines, extract_pages
+
+
+def junk_ratio(text):
+    """Share of non-whitespace characters that are U+FFFD or control/private-use characters."""
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    junk = sum(c == "\ufffd" or unicodedata.category(c) in ("Cc", "Co", "Cs") for c in chars)
+    return junk / len(chars)
+
+
+def run_engine(engine, paths, workers, page_timeout):
+    pages, total_seconds = {}, 0.0
+    for path in paths:
+        start = time.perf_counter()
+        pages[path] = extract_pages(path, engines=[engine], workers=workers, page_timeout=page_timeout)
+        total_seconds += time.perf_counter() - start
+    results = [page for doc in pages.values() for page in doc]
+    text = "".join(page.text for page in results)
+    return {
+        "pages": len(results),
+        "seconds": round(total_seconds, 3),
+        "pages_per_second": round(len(results) / total_seconds, 1) if total_seconds else None,
+        "slowest_page_ms": round(1000 * max((p.seconds for p in results), default=0.0), 1),
+        "failed_pages": sum(p.engine is None for p in results),
+        "empty_pages": sum(p.engine is not None and not p.text.strip() for p in results),
+        "chars": len(text),
+        "junk_ratio": round(junk_ratio(text), 4),
+        "texts": {path: [p.text for p in doc] for path, doc in pages.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="*", default=["uploads"], help="PDF files or directories")
+    parser.add_argument("--engines", nargs="+", default=list(EXTRACTION_ENGINES), choices=list(ENGINES))
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for the rest of a PDF once one of its pages times out")
+    parser.add_argument("--page-timeout", type=float, default=30.0, help="Seconds per page (0 = none)")
+    parser.add_argument("--json", help="Also write the full report (including texts) to this file")
+    args = parser.parse_args()
+    setup_logging("ERROR")
+
+    paths = collect_pdf_paths(args.sources)
+    if not paths:
+        raise SystemExit("No PDFs found.")
+
+    engines = available_engines(args.engines)
+    skipped = [e for e in args.engines if e not in engines]
+    if skipped:
+        print(f">> Not installed, skipped: {', '.join(skipped)}")
+    if not engines:
+        raise SystemExit("No extraction engine installed.")
+    print(f">> Comparing {engines} on {len(paths)} PDFs")
+
+    results = {engine: run_engine(engine, paths, args.workers, args.page_timeout) for engine in engines}
+    reference_name = engines[0]
+    reference = results[reference_name]["texts"]
+    for result in results.values():
+        scores = [word_f1(text, ref_text)
+                  for path in paths
+                  for text, ref_text in zip(result["texts"][path], reference[path])]
+        result["word_f1"] = round(sum(scores) / len(scores), 3) if scores else None
+
+    print(f"\n{'engine':<10} {'pages/s':>8} {'slowest ms':>11} {'failed':>7} {'empty':>6} "
+          f"{'chars':>9} {'junk':>7} {'F1 vs ' + reference_name:>14}")
+    for engine, r in results.items():
+        print(f"{engine:<10} {r['pages_per_second']!s:>8} {r['slowest_page_ms']:>11} {r['failed_pages']:>7} "
+              f"{r['empty_pages']:>6} {r['chars']:>9} {r['junk_ratio']:>7} {r['word_f1']!s:>14}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"documents": paths, "reference": reference_name, "engines": results}, f, indent=2)
+        print(f"\n>> Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
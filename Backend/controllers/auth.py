@@ -1,7 +1,10 @@
+import logging
 from flask import Blueprint, request, jsonify
 from storage.db import insert_user, check_user_credentials, get_user_by_username
 from flask_cors import cross_origin
 
+log = logging.getLogger(__name__)
+
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST', 'OPTIONS'])
@@ -10,8 +13,8 @@ def register():
     if request.method == 'OPTIONS':
         return '', 200
     
-    print(f"Register request received: {request.method}")
-    print(f"Request data: {request.get_json()}")
+    # The body holds the password, so only the method is logged
+    log.debug("Register request received: %s", request.method)
     
     data = request.json or request.form
     username = data.get('username')
@@ -33,8 +36,7 @@ def login():
     if request.method == 'OPTIONS':
         return '', 200
     
-    print(f"Login request received: {request.method}")
-    print(f"Request data: {request.get_json()}")
+    log.debug("Login request received: %s", request.method)
     
     data = request.json or request.form
     username = data.get('username')
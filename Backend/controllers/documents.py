@@ -1,19 +1,123 @@
-from flask import Blueprint, jsonify, request
-from storage.db import fetch_documents_by_department
+import base64
+import hashlib
+from flask import Blueprint, jsonify, request, make_response
+from storage.db import (
+    fetch_documents_page, fetch_department_stamp, fetch_document_by_id, search_documents,
+    fetch_document_ids_by_department, fetch_documents_by_ids, DOCUMENT_FIELDS, DEFAULT_LIST_FIELDS
+)
+from storage.vectors import get_vector_index
+from controllers.model_registry import get_embedder
 
 documents_bp = Blueprint('documents', __name__)
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(doc):
+    raw = f"{doc['uploaded_at']}|{doc['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    uploaded_at, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+    return uploaded_at, int(doc_id)
+
 @documents_bp.route('/latest', methods=['GET'])
 def latest_documents():
     # Accept department as a query parameter (e.g. /latest?department=HR)
     department = request.args.get('department')
     if not department:
         # Try JSON body fallback
-        json_data = request.json or {}
+        json_data = request.get_json(silent=True) or {}
         department = json_data.get('department')
 
     if not department:
         return jsonify({"error": "Department query parameter is required."}), 400
 
-    docs = fetch_documents_by_department(department)
-    return jsonify({"documents": docs})
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor."}), 400
+    if limit < 1:
+        return jsonify({"error": "Invalid limit or cursor."}), 400
+
+    # Large text columns are left out unless requested (?fields=id,summary,original_text)
+    fields = DEFAULT_LIST_FIELDS
+    if request.args.get('fields'):
+        fields = tuple(f.strip() for f in request.args['fields'].split(','))
+        unknown = [f for f in fields if f not in DOCUMENT_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    # Repeat polls with nothing new are answered from an index-only query
+    stamp = fetch_department_stamp(department)
+    etag = hashlib.sha1(repr((stamp, limit, cursor, sorted(fields))).encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    docs = fetch_documents_page(department, limit, after=after, fields=fields)
+    next_cursor = encode_cursor(docs[-1]) if len(docs) == limit else None
+
+    response = make_response(jsonify({"documents": docs, "next_cursor": next_cursor}))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@documents_bp.route('/search', methods=['GET'])
+def search():
+    # e.g. /search?q=safety circular&department=Safety&limit=20&offset=0
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter q is required."}), 400
+    department = request.args.get('department')
+
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or offset."}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({"error": "Invalid limit or offset."}), 400
+
+    results = search_documents(query, department=department, limit=limit, offset=offset)
+    next_offset = offset + limit if len(results) == limit else None
+    return jsonify({"results": results, "next_offset": next_offset})
+
+@documents_bp.route('/semantic-search', methods=['GET'])
+def semantic_search():
+    # e.g. /semantic-search?q=revised leave policy&department=HR&k=10
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter q is required."}), 400
+    department = request.args.get('department')
+    try:
+        k = min(int(request.args.get('k', 10)), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "Invalid k."}), 400
+    if k < 1:
+        return jsonify({"error": "Invalid k."}), 400
+
+    embedder = get_embedder()
+    if not embedder.model:
+        return jsonify({"error": "Embedding model is not available."}), 503
+
+    allowed = fetch_document_ids_by_department(department) if department else None
+    hits = get_vector_index().search(embedder.encode([query])[0], k=k, allowed_ids=allowed)
+
+    docs = fetch_documents_by_ids(doc_id for doc_id, _ in hits)
+    results = [
+        {**docs[doc_id], "score": round(score, 4)}
+        for doc_id, score in hits if doc_id in docs
+    ]
+    return jsonify({"results": results})
+
+@documents_bp.route('/<int:doc_id>', methods=['GET'])
+def get_document(doc_id):
+    # Full row, including original_text and translated_text
+    doc = fetch_document_by_id(doc_id)
+    if not doc:
+        return jsonify({"error": "Document not found."}), 404
+    return jsonify(doc)
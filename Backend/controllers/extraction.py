@@ -0,0 +1,409 @@
+"""
+Pluggable PDF text-layer extraction, page by page.
+
+Engines, tried in the order of PRISMATA_EXTRACTION_ENGINES (those not
+installed are skipped):
+ - pymupdf    MuPDF via the PyMuPDF package (native, fastest)
+ - pdfium     PDFium via pypdfium2 (native)
+ - pypdf2     PyPDF2 (pure Python; always available with the requirements)
+ - pdftotext  Poppler's pdftotext command (one process per page)
+
+Pages are extracted in up to PRISMATA_EXTRACTION_WORKERS worker processes,
+each keeping the document open between its pages. Each page gets
+PRISMATA_PAGE_TIMEOUT seconds (counted from when its extraction starts); a
+worker that overruns it is killed and replaced at once, since a call stuck
+in a parser cannot be interrupted, and the page is retried with the next
+engine, as is a page whose engine raises. One pathological page thus costs
+at most a timeout per engine instead of hanging the document. A page that
+comes back empty is not retried: it has no text layer and is left to OCR.
+
+With PRISMATA_PAGE_TIMEOUT=0 pages are extracted on the calling thread
+instead, reusing the caller's PdfReader for pypdf2, without any timeout.
+
+Results are PageText tuples in page order, with the engine that produced
+each page and how long it took.
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import subprocess
+import time
+from collections import deque, namedtuple
+
+from controllers.metrics import Counter
+
+# --- Optional imports ---
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+log = logging.getLogger(__name__)
+
+EXTRACTION_ENGINES = [
+    name.strip() for name in
+    os.environ.get("PRISMATA_EXTRACTION_ENGINES", "pymupdf,pdfium,pypdf2,pdftotext").split(",")
+    if name.strip()
+]
+# Worker processes per document
+EXTRACTION_WORKERS = int(os.environ.get("PRISMATA_EXTRACTION_WORKERS", "0")) or os.cpu_count() or 1
+# Seconds per page and engine; 0 disables the timeout (extraction then runs
+# directly on the calling thread, without worker processes)
+PAGE_TIMEOUT = float(os.environ.get("PRISMATA_PAGE_TIMEOUT", "30"))
+
+PageText = namedtuple("PageText", "number text engine seconds error")
+
+extract_pages_total = Counter("prismata_extract_pages_total", "Pages by extraction engine and outcome",
+                              labels=("engine", "outcome"))
+
+
+class ExtractionEngine:
+    """One way of reading a PDF's text layer. Page numbers are 1-based."""
+    name = None
+
+    @staticmethod
+    def available():
+        return False
+
+    def open(self, path):
+        raise NotImplementedError
+
+    def page_count(self, document):
+        raise NotImplementedError
+
+    def page_text(self, document, page_number):
+        raise NotImplementedError
+
+    def close(self, document):
+        pass
+
+
+class PyMuPDFEngine(ExtractionEngine):
+    name = "pymupdf"
+
+    @staticmethod
+    def available():
+        return fitz is not None
+
+    def open(self, path):
+        return fitz.open(path)
+
+    def page_count(self, document):
+        return document.page_count
+
+    def page_text(self, document, page_number):
+        return document[page_number - 1].get_text("text")
+
+    def close(self, document):
+        document.close()
+
+
+class PdfiumEngine(ExtractionEngine):
+    name = "pdfium"
+
+    @staticmethod
+    def available():
+        return pypdfium2 is not None
+
+    def open(self, path):
+        return pypdfium2.PdfDocument(path)
+
+    def page_count(self, document):
+        return len(document)
+
+    def page_text(self, document, page_number):
+        page = document[page_number - 1]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range()
+        finally:
+            textpage.close()
+            page.close()
+
+    def close(self, document):
+        document.close()
+
+
+class PyPDF2Engine(ExtractionEngine):
+    name = "pypdf2"
+
+    @staticmethod
+    def available():
+        return PdfReader is not None
+
+    def open(self, path):
+        # Also accepts an already parsed PdfReader (see processor.open_pdf)
+        return path if isinstance(path, PdfReader) else PdfReader(path)
+
+    def page_count(self, document):
+        return len(document.pages)
+
+    def page_text(self, document, page_number):
+        return document.pages[page_number - 1].extract_text() or ""
+
+
+class PdftotextEngine(ExtractionEngine):
+    """Poppler command-line tools (also used by pdf2image for OCR)."""
+    name = "pdftotext"
+
+    @staticmethod
+    def available():
+        return bool(shutil.which("pdftotext") and shutil.which("pdfinfo"))
+
+    def open(self, path):
+        return path
+
+    def page_count(self, document):
+        out = subprocess.run(["pdfinfo", document], capture_output=True, text=True, check=True).stdout
+        for line in out.splitlines():
+            if line.startswith("Pages:"):
+                return int(line.split()[1])
+        raise ValueError("pdfinfo reported no page count")
+
+    def page_text(self, document, page_number):
+        return subprocess.run(
+            ["pdftotext", "-q", "-enc", "UTF-8", "-f", str(page_number), "-l", str(page_number), document, "-"],
+            capture_output=True, text=True, check=True
+        ).stdout
+
+
+ENGINES = {engine.name: engine for engine in (PyMuPDFEngine, PdfiumEngine, PyPDF2Engine, PdftotextEngine)}
+
+
+def available_engines(names=None):
+    """Installed engines among `names` (default: EXTRACTION_ENGINES), in order."""
+    names = EXTRACTION_ENGINES if names is None else names
+    unknown = [n for n in names if n not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown extraction engine(s): {', '.join(unknown)}")
+    return [n for n in names if ENGINES[n].available()]
+
+
+# Each worker process keeps the document it is working on open between pages
+_worker_document = (None, None)
+
+
+def _extract_page(engine_name, path, page_number):
+    """(text, seconds) for one page. Runs in a worker process."""
+    global _worker_document
+    engine = ENGINES[engine_name]()
+    key, document = _worker_document
+    if key != (engine_name, path):
+        if key is not None:
+            ENGINES[key[0]]().close(document)
+        document = engine.open(path)
+        _worker_document = ((engine_name, path), document)
+    start = time.perf_counter()
+    text = engine.page_text(document, page_number)
+    return text, time.perf_counter() - start
+
+
+def page_count(path, engines=None, reader=None):
+    """Number of pages, from the first engine able to open the file (0 if none)."""
+    if reader is not None:
+        return len(reader.pages)
+    for name in engines or available_engines():
+        engine = ENGINES[name]()
+        try:
+            document = engine.open(path)
+            try:
+                return engine.page_count(document)
+            finally:
+                engine.close(document)
+        except Exception as e:
+            log.warning("%s could not open %s: %s", name, path, e)
+    return 0
+
+
+def _in_process_pages(path, engines, count, reader):
+    """Extraction on the calling thread (no timeout), reusing `reader` for pypdf2."""
+    documents = {}
+    try:
+        for page_number in range(1, count + 1):
+            errors = []
+            for name in engines:
+                engine = ENGINES[name]()
+                start = time.perf_counter()
+                try:
+                    if name not in documents:
+                        documents[name] = engine.open(reader if reader is not None and name == "pypdf2" else path)
+                    text = engine.page_text(documents[name], page_number)
+                except Exception as e:
+                    extract_pages_total.inc(engine=name, outcome="error")
+                    errors.append(f"{name}: {e}")
+                    continue
+                extract_pages_total.inc(engine=name, outcome="ok")
+                yield PageText(page_number, text, name, time.perf_counter() - start, "; ".join(errors) or None)
+                break
+            else:
+                yield PageText(page_number, "", None, 0.0, "; ".join(errors))
+            if errors:
+                log.warning("Page %d of %s: %s", page_number, path, "; ".join(errors))
+    finally:
+        for name, document in documents.items():
+            if document is not reader:
+                ENGINES[name]().close(document)
+
+
+def _worker_main(conn):
+    """Worker process loop: (engine, path, page) in, (ok, (text, seconds) or error) out."""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        try:
+            result = (True, _extract_page(*task))
+        except Exception as e:
+            result = (False, str(e) or type(e).__name__)
+        conn.send(result)
+
+
+class _Worker:
+    """One extraction process. Tasks are only sent to idle workers, so a deadline starts with the task."""
+
+    def __init__(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started = self.deadline = None
+
+    def start(self, task, path, page_timeout):
+        page_number, engine_index, _, name = task
+        self.task = task
+        self.started = time.perf_counter()
+        self.deadline = self.started + page_timeout
+        self.conn.send((name, path, page_number))
+
+    def stop(self, kill=False):
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                kill = True
+        if kill:
+            self.process.kill()
+        self.process.join(timeout=None if kill else 1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def _isolated_pages(path, engines, tasks, workers, page_timeout):
+    """
+    Extract pages in worker processes. `tasks` are (page_number,
+    first engine index, errors so far), in page order. A worker that
+    overruns page_timeout is killed and replaced at once, and the page's
+    next engine runs ahead of the queued pages. Yields PageTexts in page order.
+    """
+    errors = {page_number: list(previous) for page_number, _, previous in tasks}
+    pending = deque()
+    done = {}
+
+    def next_engine(page_number, engine_index):
+        if engine_index < len(engines):
+            return (page_number, engine_index, None, engines[engine_index])
+        done[page_number] = PageText(page_number, "", None, 0.0, "; ".join(errors[page_number]))
+        return None
+
+    for page_number, engine_index, _ in tasks:
+        task = next_engine(page_number, engine_index)
+        if task:
+            pending.append(task)
+    log.debug("Extracting %d pages of %s in %d worker processes", len(tasks), path, min(workers, len(tasks)))
+    pool = [_Worker() for _ in range(max(1, min(workers, len(tasks))))]
+
+    def failed(task, error):
+        page_number, engine_index, _, name = task
+        errors[page_number].append(f"{name}: {error}")
+        retry = next_engine(page_number, engine_index + 1)
+        if retry:
+            pending.appendleft(retry)  # ahead of pages nobody has waited on yet
+
+    try:
+        for page_number, _, _ in tasks:
+            while page_number not in done:
+                for worker in pool:
+                    if worker.task is None and pending:
+                        worker.start(pending.popleft(), path, page_timeout)
+                busy = [w for w in pool if w.task is not None]
+                wait_for = max(0.0, min(w.deadline for w in busy) - time.perf_counter())
+                ready = multiprocessing.connection.wait([w.conn for w in busy], timeout=wait_for)
+                for i, worker in enumerate(pool):
+                    task = worker.task
+                    if task is None:
+                        continue
+                    name = task[3]
+                    if worker.conn in ready:
+                        try:
+                            ok, value = worker.conn.recv()
+                        except EOFError:
+                            ok, value = False, f"worker exited ({worker.process.exitcode})"
+                            worker.stop(kill=True)
+                            pool[i] = worker = _Worker()
+                        worker.task = None
+                        if ok:
+                            text, seconds = value
+                            extract_pages_total.inc(engine=name, outcome="ok")
+                            done[task[0]] = PageText(task[0], text, name, seconds,
+                                                     "; ".join(errors[task[0]]) or None)
+                        else:
+                            extract_pages_total.inc(engine=name, outcome="error")
+                            failed(task, value)
+                    elif time.perf_counter() >= worker.deadline:
+                        extract_pages_total.inc(engine=name, outcome="timeout")
+                        worker.stop(kill=True)
+                        pool[i] = _Worker()
+                        failed(task, f"timed out after {page_timeout:g}s")
+            page = done.pop(page_number)
+            if errors[page_number]:
+                log.warning("Page %d of %s: %s", page_number, path, "; ".join(errors[page_number]))
+            yield page
+    finally:
+        for worker in pool:
+            worker.stop(kill=worker.task is not None)
+
+
+def iter_pages(path, engines=None, workers=None, page_timeout=None, reader=None):
+    """
+    Lazily yield a PageText per page, in page order, as pages complete.
+    `reader` may be a PdfReader already open on `path`; it is used for the
+    page count, and by pypdf2 when there is no timeout.
+    """
+    engines = available_engines(engines)
+    if not engines:
+        log.error("No PDF extraction engine installed -> cannot extract text.")
+        return
+    workers = EXTRACTION_WORKERS if workers is None else workers
+    page_timeout = PAGE_TIMEOUT if page_timeout is None else page_timeout
+    count = page_count(path, engines, reader=reader)
+    if not count:
+        return
+    if page_timeout:
+        yield from _isolated_pages(path, engines, [(n, 0, []) for n in range(1, count + 1)],
+                                   workers, page_timeout)
+    else:
+        yield from _in_process_pages(path, engines, count, reader)
+
+
+def extract_pages(path, engines=None, workers=None, page_timeout=None, reader=None):
+    """[PageText] for every page of the PDF."""
+    return list(iter_pages(path, engines, workers, page_timeout, reader))
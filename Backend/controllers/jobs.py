@@ -0,0 +1,189 @@
+"""
+Background job queue for PDF processing.
+
+Uploads are handed to a small local worker pool and tracked in the `jobs`
+table, so the HTTP request returns as soon as the file is on disk. The pool
+size caps how many documents run through the models at once
+(PRISMATA_MAX_CONCURRENT_JOBS, default 1); further jobs wait in the queue.
+"""
+
+import logging
+import os
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from controllers.pipeline import process_pdf, model_version_key, derived_field_versions, embed_text, EMBEDDING_MODEL
+from storage.db import (
+    insert_document, insert_job, update_job, fetch_job, fail_unfinished_jobs,
+    fetch_cached_result, insert_cached_result, fetch_document_ids_with_text
+)
+from storage.vectors import get_vector_index
+from controllers.metrics import Gauge, cache_requests_total, jobs_total
+
+log = logging.getLogger(__name__)
+
+MAX_CONCURRENT_JOBS = int(os.environ.get('PRISMATA_MAX_CONCURRENT_JOBS', '1'))
+
+_executor = None
+_executor_lock = threading.Lock()
+# Notified whenever a job in this process records progress (used by SSE)
+_job_updates = threading.Condition()
+# Jobs submitted by this process that have not finished, by state
+_job_states = {}
+_job_states_lock = threading.Lock()
+
+
+def _set_state(job_id, state):
+    with _job_states_lock:
+        if state is None:
+            _job_states.pop(job_id, None)
+        else:
+            _job_states[job_id] = state
+
+
+def queue_depth():
+    with _job_states_lock:
+        states = list(_job_states.values())
+    return {state: states.count(state) for state in ('queued', 'running')}
+
+
+Gauge("prismata_jobs_in_progress", "Processing jobs of this process waiting or running",
+      queue_depth, labels=("state",))
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, MAX_CONCURRENT_JOBS),
+                thread_name_prefix='prismata-job'
+            )
+        return _executor
+
+
+def store_document(filename, result):
+    """Insert a processed document row and return its id."""
+    return insert_document(
+        file_name=filename,
+        uploaded_at=_now(),
+        original_text=result.get("original_text"),
+        language=result.get("language"),
+        translated_text=result.get("translated_text"),
+        summary=result.get("summary"),
+        department_label=result.get("department_label"),
+        notes=None,
+        trace=result.get("trace"),
+        # Cached results carry no versions; their cache key matched the current ones
+        versions=result.get("versions") or derived_field_versions()
+    )
+
+
+def _embed_document(document_id, text):
+    try:
+        embeddings = embed_text(text)
+        if embeddings is not None:
+            get_vector_index().append(document_id, embeddings, model=EMBEDDING_MODEL)
+    except Exception:
+        log.exception("Embedding document %s failed", document_id)
+
+
+def store_cached_document(filename, result):
+    """
+    Insert a document for a cached result and add it to the vector index.
+    The cache holds no vectors: those of an earlier document with the same
+    text are copied, and only if there is none is the text embedded again,
+    on the job pool so the request does not wait for the encoder.
+    """
+    document_id = store_document(filename, result)
+    text = result.get("original_text") or ""
+    if not get_vector_index().copy(fetch_document_ids_with_text(text), document_id):
+        _get_executor().submit(_embed_document, document_id, text)
+    return document_id
+
+
+def lookup_cached_result(content_hash):
+    """Stored result for identical PDF bytes processed by the current models."""
+    result = fetch_cached_result(content_hash, model_version_key())
+    cache_requests_total.inc(cache="result", outcome="hit" if result else "miss")
+    return result
+
+
+def _update(job_id, **fields):
+    update_job(job_id, _now(), **fields)
+    with _job_updates:
+        _job_updates.notify_all()
+
+
+def _run_job(job_id, filepath, filename, content_hash=None, reader=None):
+    _set_state(job_id, 'running')
+    _update(job_id, status='running', stage='started')
+
+    def on_progress(stage, partial):
+        _update(job_id, stage=stage, result=partial)
+
+    try:
+        result = process_pdf(filepath, on_progress=on_progress, reader=reader)
+        embeddings = result.pop("embeddings", None)
+        document_id = store_document(filename, result)
+        if embeddings is not None:
+            get_vector_index().append(document_id, embeddings, model=EMBEDDING_MODEL)
+        # Results produced by fallbacks (model not loaded) are not cached
+        if content_hash and result.get("versions") == derived_field_versions():
+            insert_cached_result(content_hash, model_version_key(), result, _now())
+        _update(job_id, status='completed', stage='stored',
+                result=result, document_id=document_id)
+        jobs_total.inc(status='completed')
+    except Exception as e:
+        log.exception("Job %s failed", job_id)
+        _update(job_id, status='failed', error=str(e))
+        jobs_total.inc(status='failed')
+    finally:
+        _set_state(job_id, None)
+
+
+def submit_job(filepath, filename, content_hash=None, reader=None):
+    """
+    Queue a saved PDF for processing and return the new job id. An already
+    parsed PdfReader for the file can be passed to skip re-reading it.
+    """
+    job_id = uuid.uuid4().hex
+    insert_job(job_id, filename, filepath, _now())
+    _set_state(job_id, 'queued')
+    _get_executor().submit(_run_job, job_id, filepath, filename, content_hash, reader)
+    return job_id
+
+
+def get_job(job_id):
+    return fetch_job(job_id)
+
+
+def iter_job_updates(job_id, poll_seconds=5.0):
+    """
+    Yield the job row each time it changes, until it completes or fails.
+    Wakes immediately for jobs running in this process; the poll interval
+    covers jobs updated by other processes.
+    """
+    last_seen = None
+    while True:
+        job = fetch_job(job_id)
+        if job is None:
+            return
+        if job["updated_at"] != last_seen:
+            last_seen = job["updated_at"]
+            yield job
+        if job["status"] in ("completed", "failed"):
+            return
+        with _job_updates:
+            _job_updates.wait(timeout=poll_seconds)
+
+
+def recover_jobs():
+    """Jobs from a previous process can never finish; mark them as failed."""
+    fail_unfinished_jobs(_now())
@@ -0,0 +1,147 @@
+"""
+Weighted keyword classifier used as a cheap first pass before flan-t5.
+
+Rules live in config/keyword_rules.json:
+
+    {
+        "min_score": 4,          # top department needs at least this score...
+        "min_margin": 2,         # ...and this lead over the runner-up to be "confident"
+        "departments": {
+            "Finance": {"invoice*": 3, "bill": 1, ...},
+            ...
+        }
+    }
+
+Terms match whole words, case-insensitively; a trailing * allows any word
+ending ("invoice*" matches "invoices") and spaces inside a phrase match any
+whitespace. All terms are compiled into a single regex, so a document is
+scanned once no matter how many rules there are. The file is re-read when its
+modification time changes, so rules can be tuned without a restart.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+RULES_PATH = os.environ.get(
+    "PRISMATA_KEYWORD_RULES",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "keyword_rules.json")
+)
+RELOAD_CHECK_SECONDS = 2.0
+FALLBACK_LABEL = "Other"
+
+
+def _term_pattern(term):
+    prefix = term.endswith("*")
+    words = term.rstrip("*").split()
+    pattern = r"\s+".join(re.escape(w) for w in words)
+    return rf"\b{pattern}\w*" if prefix else rf"\b{pattern}\b"
+
+
+class KeywordRules:
+    """Compiled form of one version of the rules file."""
+
+    def __init__(self, config):
+        self.version = None
+        self.departments = list(config["departments"])
+        self.min_score = config.get("min_score", 1)
+        self.min_margin = config.get("min_margin", 1)
+
+        # One named group per distinct term; a term may score for several departments
+        self.term_weights = []
+        groups, index = [], {}
+        for department, terms in config["departments"].items():
+            for term, weight in terms.items():
+                key = term.lower()
+                if key not in index:
+                    index[key] = len(self.term_weights)
+                    self.term_weights.append([])
+                    groups.append(f"(?P<t{index[key]}>{_term_pattern(key)})")
+                self.term_weights[index[key]].append((department, weight))
+        # Longer alternatives first so "purchase order" wins over shorter overlaps
+        groups.sort(key=len, reverse=True)
+        self.regex = re.compile("|".join(groups), re.IGNORECASE) if groups else None
+
+    def score(self, text):
+        scores = dict.fromkeys(self.departments, 0)
+        if self.regex is None or not text:
+            return scores
+        for match in self.regex.finditer(text):
+            for department, weight in self.term_weights[int(match.lastgroup[1:])]:
+                scores[department] += weight
+        return scores
+
+    def classify(self, text):
+        """(label, confident, scores). Ties go to the department listed first."""
+        scores = self.score(text)
+        ranked = sorted(scores.items(), key=lambda kv: -kv[1])
+        if not ranked or ranked[0][1] == 0:
+            return FALLBACK_LABEL, False, scores
+        top, top_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        confident = top_score >= self.min_score and top_score - runner_up >= self.min_margin
+        return top, confident, scores
+
+
+class KeywordClassifier:
+    """Thread-safe holder of the current rules, reloaded when the file changes."""
+
+    def __init__(self, path=RULES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._rules = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._reload()
+
+    def _reload(self):
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        rules = KeywordRules(json.loads(raw))
+        # Content fingerprint, so cached results are invalidated by rule edits
+        rules.version = hashlib.sha1(raw).hexdigest()[:12]
+        self._rules, self._mtime = rules, mtime
+        log.info("Keyword rules loaded from %s", self.path)
+
+    def rules(self):
+        now = time.monotonic()
+        if now - self._checked_at >= RELOAD_CHECK_SECONDS:
+            with self._lock:
+                if now - self._checked_at >= RELOAD_CHECK_SECONDS:
+                    self._checked_at = now
+                    try:
+                        if os.path.getmtime(self.path) != self._mtime:
+                            self._reload()
+                    except (OSError, ValueError, KeyError) as e:
+                        # Keep serving the last good rules while the file is being edited
+                        log.warning("Could not reload keyword rules: %s", e)
+        return self._rules
+
+    def score(self, text):
+        return self.rules().score(text)
+
+    def classify(self, text):
+        return self.rules().classify(text)
+
+    @property
+    def version(self):
+        return self.rules().version
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_keyword_classifier():
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = KeywordClassifier()
+        return _classifier
@@ -0,0 +1,224 @@
+"""
+Process-wide metrics, served in the Prometheus text format at /metrics.
+
+Counters and histograms are updated in place by the pipeline, the job queue
+and the caches. Gauges are read from callbacks when /metrics is scraped, so
+values kept elsewhere (model load times, queue depth, cascade tiers) are
+never copied. There is no dependency on prometheus_client; the exposition
+format is small enough to write directly.
+
+Trace collects the timings and counts of one document. process_pdf stores it
+with the document row and feeds it into the shared histograms.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Blueprint, Response
+
+# Seconds; covers a keyword match (ms) up to OCR of a long scan (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_metrics = []
+
+
+def _number_text(value):
+    """Exact text of a sample value or bucket bound (integral values without ".0")."""
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        with _lock:
+            _metrics.append(self)
+
+    def render_labels(self, sample_name):
+        return self.labels
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self._values = {}
+        self._lock = threading.Lock()
+        super().__init__(name, help_text, labels)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        super().__init__(name, help_text, labels)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, count, total) in self._series.items():
+                for bound, n in zip(self.buckets, counts):
+                    out.append((self.name + "_bucket", key + (_number_text(bound),), n))
+                out.append((self.name + "_bucket", key + ("+Inf",), count))
+                out.append((self.name + "_count", key, count))
+                out.append((self.name + "_sum", key, total))
+        return out
+
+    def render_labels(self, sample_name):
+        return self.labels + ("le",) if sample_name.endswith("_bucket") else self.labels
+
+
+class Gauge(_Metric):
+    """Value(s) computed at scrape time: callback() -> number or {label values: number}."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback, labels=()):
+        self.callback = callback
+        super().__init__(name, help_text, labels)
+
+    def samples(self):
+        value = self.callback()
+        if not self.labels:
+            return [] if value is None else [(self.name, (), value)]
+        return [(self.name, key if isinstance(key, tuple) else (key,), v)
+                for key, v in value.items() if v is not None]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        try:
+            samples = metric.samples()
+        except Exception as e:
+            # One broken callback must not take the whole endpoint down
+            lines.append(f"# {metric.name} unavailable: {e}")
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, key, value in samples:
+            lines.append(f"{sample_name}{_label_text(metric.render_labels(sample_name), key)} {_number_text(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Pipeline metrics ---
+stage_seconds = Histogram("prismata_stage_seconds", "Time spent per pipeline stage", labels=("stage",))
+document_seconds = Histogram("prismata_document_seconds", "End-to-end pipeline time per document")
+pages_total = Counter("prismata_pages_total", "Pages extracted", labels=("source",))
+tokens_total = Counter("prismata_tokens_total", "Tokens read and generated by the local models", labels=("model", "direction"))
+cache_requests_total = Counter("prismata_cache_requests_total", "Cache lookups", labels=("cache", "outcome"))
+jobs_total = Counter("prismata_jobs_total", "Finished processing jobs", labels=("status",))
+
+
+# Trace of the document being processed by the current thread, if any
+_current_trace = ContextVar("prismata_trace", default=None)
+
+
+def record_tokens(model, direction, amount):
+    """Count model tokens globally and on the active document trace."""
+    amount = int(amount)
+    tokens_total.inc(amount, model=model, direction=direction)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(f"{direction}_tokens", amount)
+
+
+class Trace:
+    """
+    Stage timings and counters for one document. A stage may be entered many
+    times (e.g. once per page); its total is observed once, by finish().
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    @contextmanager
+    def active(self):
+        """Make this the trace that record_tokens() and friends report to."""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def finish(self):
+        """JSON-ready summary; also records the end-to-end time."""
+        total = time.perf_counter() - self.started
+        document_seconds.observe(total)
+        for name, seconds in self.stages.items():
+            stage_seconds.observe(seconds, stage=name)
+        return {
+            "total_seconds": round(total, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            "counts": dict(self.counts),
+        }
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,253 @@
+"""
+Thin clients for the shared model server (model_server.py).
+
+When PRISMATA_MODEL_SERVER_URL is set, the pipeline registers RemoteLLM,
+RemoteEmbedder and RemoteTranslator instead of loading the weights itself, so
+every web worker sends its inference to the one process that holds them:
+
+    PRISMATA_MODEL_SERVER_URL=http://127.0.0.1:8765
+    PRISMATA_MODEL_SERVER_URL=unix:/run/prismata/models.sock
+
+The remote classes mirror the attributes and methods of LocalLLM,
+LocalEmbedder and LocalTranslator that the pipeline uses, including their
+fallbacks: a summarizer that cannot be reached keeps the text unchanged, and
+label scoring / embedding raise so their callers fall back as they would
+without a local model. The server decides batch sizes; batch_size arguments
+are accepted for compatibility and ignored.
+
+Requests are JSON over HTTP/1.1 with one keep-alive connection per thread.
+numpy arrays travel as base64-encoded raw buffers (see encode_array).
+"""
+
+import base64
+import http.client
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+# --- Optional imports ---
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = logging.getLogger(__name__)
+
+MODEL_SERVER_URL = os.environ.get("PRISMATA_MODEL_SERVER_URL")
+# Long documents are summarized chunk by chunk on the server, so allow minutes
+MODEL_SERVER_TIMEOUT = float(os.environ.get("PRISMATA_MODEL_SERVER_TIMEOUT", "600"))
+# How long to wait before asking an unreachable server again
+HEALTH_RETRY_SECONDS = 30
+
+
+class ModelServerError(RuntimeError):
+    """The model server could not be reached or refused a request."""
+
+
+def encode_array(array):
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return {"shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def decode_array(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32).reshape(payload["shape"])
+
+
+def parse_address(url):
+    """('unix', path) or ('tcp', (host, port)) for a model server URL."""
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        return "unix", parts.path
+    if parts.scheme in ("http", ""):
+        return "tcp", (parts.hostname or "127.0.0.1", parts.port or 8765)
+    raise ValueError(f"Unsupported model server URL: {url}")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ModelServerClient:
+    """JSON calls to the model server over a per-thread keep-alive connection."""
+
+    def __init__(self, url=MODEL_SERVER_URL, timeout=MODEL_SERVER_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.kind, self.address = parse_address(url)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.kind == "unix":
+                conn = _UnixHTTPConnection(self.address, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(*self.address, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def call(self, path, payload=None):
+        """POST payload as JSON (GET when None) and return the decoded reply."""
+        body = None if payload is None else json.dumps(payload).encode("utf-8")
+        # One retry: the server may have closed an idle keep-alive connection
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request("GET" if body is None else "POST", path, body=body,
+                             headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                self._drop_connection()
+                if attempt == 2:
+                    raise ModelServerError(f"Model server {self.url} unreachable: {e}") from e
+        if response.status != 200:
+            try:
+                message = json.loads(data).get("error", "")
+            except ValueError:
+                message = data[:200].decode("utf-8", "replace")
+            raise ModelServerError(f"Model server {path} failed ({response.status}): {message}")
+        return json.loads(data)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url=MODEL_SERVER_URL):
+    """One client per server URL and process."""
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = ModelServerClient(url)
+        return client
+
+
+class _RemoteModel:
+    """A model served by the model server; `info` is its /health entry."""
+
+    def __init__(self, name, client=None):
+        self.name = name
+        self.client = client or get_client()
+        self._info = None
+        self._checked = None
+
+    @property
+    def info(self):
+        # Cached once the server answers; retried while it is unreachable
+        if self._info is None and (self._checked is None
+                                   or time.monotonic() - self._checked >= HEALTH_RETRY_SECONDS):
+            self._checked = time.monotonic()
+            try:
+                models = self.client.call("/health")["models"]
+                self._info = models.get(self.name, {"loaded": False})
+            except ModelServerError as e:
+                log.error("Could not reach model server for '%s': %s", self.name, e)
+        return self._info or {}
+
+    @property
+    def loaded(self):
+        return bool(self.info.get("loaded"))
+
+
+class RemoteLLM(_RemoteModel):
+    """LocalLLM served by the model server."""
+
+    def __init__(self, name="llm", client=None):
+        super().__init__(name, client)
+
+    @property
+    def model_name(self):
+        return self.info.get("model_name")
+
+    @property
+    def backend(self):
+        return self.info.get("backend")
+
+    def generate_batch(self, prompts, max_length, min_length=0, batch_size=None):
+        return self.client.call("/generate", {
+            "model": self.name, "prompts": list(prompts),
+            "max_length": max_length, "min_length": min_length,
+        })["outputs"]
+
+    def score_labels(self, prompts, labels, batch_size=None):
+        reply = self.client.call("/score_labels", {
+            "model": self.name, "prompts": list(prompts), "labels": list(labels),
+        })
+        return decode_array(reply["scores"])
+
+    def summarize_batch(self, texts, batch_size=None):
+        return self._summarize("/summarize_batch", texts)
+
+    def summarize_many(self, texts, batch_size=None):
+        return self._summarize("/summarize", texts)
+
+    def summarize(self, text):
+        return self.summarize_many([text])[0]
+
+    def _summarize(self, path, texts):
+        texts = list(texts)
+        if not self.loaded:
+            log.warning("No summarizer -> fallback (keep text unchanged).")
+            return texts
+        try:
+            return self.client.call(path, {"model": self.name, "texts": texts})["summaries"]
+        except ModelServerError as e:
+            log.warning("Summarization failed -> fallback: %s", e)
+            return texts
+
+
+class RemoteEmbedder(_RemoteModel):
+    """LocalEmbedder served by the model server."""
+
+    def __init__(self, client=None):
+        super().__init__("embedder", client)
+
+    @property
+    def model(self):
+        # The model name stands in for LocalEmbedder.model in truthiness checks
+        return self.info.get("model") if self.loaded else None
+
+    @property
+    def dim(self):
+        return self.info.get("dim")
+
+    def encode(self, texts, batch_size=None):
+        return decode_array(self.client.call("/embed", {"texts": list(texts)})["vectors"])
+
+
+class RemoteTranslator(_RemoteModel):
+    """LocalTranslator served by the model server."""
+
+    def __init__(self, client=None):
+        super().__init__("translator", client)
+
+    @property
+    def model_name(self):
+        return self.info.get("model")
+
+    def supports(self, lang):
+        return self.loaded and lang in self.info.get("languages", ())
+
+    def translate_batch(self, sentences, src_lang, batch_size=None):
+        return self.client.call("/translate", {
+            "sentences": list(sentences), "src_lang": src_lang,
+        })["translations"]
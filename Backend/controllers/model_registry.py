@@ -0,0 +1,131 @@
+"""
+Process-wide registry for the local models used by the pipeline.
+
+Models are loaded lazily on first use (or eagerly via preload()) and then kept
+warm for the lifetime of the worker process, so individual requests never pay
+for tokenizer/weight loading. Loading is guarded by a lock, so concurrent
+request threads asking for the same model block on a single load instead of
+racing each other.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from controllers.metrics import Gauge
+
+# --- Optional imports ---
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+log = logging.getLogger(__name__)
+
+_factories = {}
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _current_rss_mb():
+    if psutil:
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    if resource:
+        # ru_maxrss is in kilobytes on Linux (peak rather than current RSS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+def register_model(name, factory):
+    """Register a zero-argument callable that builds the model called `name`."""
+    with _lock:
+        _factories[name] = factory
+
+
+def registered_models():
+    """Names of every model with a registered factory."""
+    with _lock:
+        return set(_factories)
+
+
+def get_model(name):
+    """Return the shared instance of `name`, loading it on first use."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        # Another thread may have finished loading while we waited
+        model = _models.get(name)
+        if model is not None:
+            return model
+
+        factory = _factories.get(name)
+        if factory is None:
+            raise KeyError(f"No model registered under '{name}'")
+
+        log.info("Loading model '%s'...", name)
+        rss_before = _current_rss_mb()
+        start = time.perf_counter()
+        model = factory()
+        load_seconds = time.perf_counter() - start
+        rss_after = _current_rss_mb()
+
+        _models[name] = model
+        _stats[name] = {
+            "load_seconds": round(load_seconds, 3),
+            "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+            "rss_after_mb": round(rss_after, 1) if rss_after is not None else None,
+            "loaded_at": time.time(),
+        }
+        log.info("Model '%s' ready in %.2fs", name, load_seconds)
+        return model
+
+
+def get_llm():
+    """Shortcut for the flan-t5 wrapper used by summarization and classification."""
+    import controllers.pipeline  # noqa: F401  (registers the 'llm' factory)
+    return get_model("llm")
+
+
+def get_embedder():
+    """Shortcut for the multilingual sentence encoder used by semantic search."""
+    import controllers.pipeline  # noqa: F401  (registers the 'embedder' factory)
+    return get_model("embedder")
+
+
+def preload(names=None):
+    """Load the given models (default: every registered model) up front."""
+    import controllers.pipeline  # noqa: F401
+    for name in names or list(_factories):
+        get_model(name)
+
+
+def unload(name):
+    """Drop a model so the next get_model() call reloads it."""
+    with _lock:
+        _models.pop(name, None)
+        _stats.pop(name, None)
+
+
+def model_stats():
+    """Load time and memory figures for every model loaded so far."""
+    with _lock:
+        return {
+            name: {**stats, "loaded": name in _models}
+            for name, stats in _stats.items()
+        }
+
+
+Gauge("prismata_model_load_seconds", "Time taken to load each model",
+      lambda: {name: stats["load_seconds"] for name, stats in model_stats().items()}, labels=("model",))
+Gauge("prismata_model_rss_delta_mb", "Resident memory added by loading each model",
+      lambda: {name: stats["rss_delta_mb"] for name, stats in model_stats().items()}, labels=("model",))
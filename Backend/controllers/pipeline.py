@@ -2,101 +2,380 @@
 Standalone prototype: PDF -> (extract + translate + summarize + classify).
 Uses two local models:
  - google/flan-t5-base (summarization + classification)
- - facebook/m2m100_418M (translation)
+ - facebook/m2m100_418M (translation, when PRISMATA_TRANSLATION=1)
 """
 
+import logging
 import os
+import re
+import threading
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
 from pathlib import Path
+
+from controllers.model_registry import get_llm, get_embedder, get_model, register_model
+from controllers.model_client import MODEL_SERVER_URL, RemoteLLM, RemoteEmbedder, RemoteTranslator
+from controllers.keywords import get_keyword_classifier
+from controllers.extraction import iter_pages, extract_pages
+from controllers.metrics import Gauge, Trace, cache_requests_total, pages_total, record_tokens
+from storage.db import fetch_translations, insert_translations, VERSIONED_FIELDS
 # from IndicTransToolkit.processor import IndicProcessor, IndicTransModel
 
+log = logging.getLogger(__name__)
+
 # --- Optional imports ---
+# Only light dependencies are imported here. transformers/torch (seconds and
+# hundreds of MB), the OCR stack and langdetect are imported on first use by
+# _load_transformers(), _load_ocr() and _get_language_factory(), so a process
+# that never runs a model, OCR or language detection does not pay for them.
 try:
     from PyPDF2 import PdfReader
 except ImportError:
     PdfReader = None
 
 try:
-    import pytesseract
-    from pdf2image import convert_from_path
+    import numpy as np
 except ImportError:
-    pytesseract = None
-    convert_from_path = None
+    np = None
 
-try:
-    from langdetect import detect
-except ImportError:
-    detect = None
+pytesseract = None
+convert_from_path = None
+AutoTokenizer = AutoModel = AutoModelForSeq2SeqLM = None
+M2M100ForConditionalGeneration = M2M100Tokenizer = pipeline = None
+torch = None
+BaseModelOutput = None
+ORTModelForSeq2SeqLM = None
 
-# transformers
-_HAVE_TRANSFORMERS = False
-try:
-    from transformers import (
-        AutoTokenizer, AutoModelForSeq2SeqLM,
-        M2M100ForConditionalGeneration, M2M100Tokenizer,
-        pipeline
-    )
-    import torch
-    _HAVE_TRANSFORMERS = True
-except ImportError:
-    pass
+_HAVE_TRANSFORMERS = None  # unknown until _load_transformers() runs
+_HAVE_OCR = None
+_import_lock = threading.Lock()
+
+
+def _load_transformers() -> bool:
+    """Import transformers and torch (and optimum, if installed) once per process."""
+    global _HAVE_TRANSFORMERS, AutoTokenizer, AutoModel, AutoModelForSeq2SeqLM
+    global M2M100ForConditionalGeneration, M2M100Tokenizer, pipeline, torch
+    global BaseModelOutput, ORTModelForSeq2SeqLM
+    with _import_lock:
+        if _HAVE_TRANSFORMERS is None:
+            try:
+                from transformers import (
+                    AutoTokenizer, AutoModel, AutoModelForSeq2SeqLM,
+                    M2M100ForConditionalGeneration, M2M100Tokenizer,
+                    pipeline
+                )
+                from transformers.modeling_outputs import BaseModelOutput
+                import torch
+                _HAVE_TRANSFORMERS = True
+            except ImportError:
+                _HAVE_TRANSFORMERS = False
+            try:
+                from optimum.onnxruntime import ORTModelForSeq2SeqLM
+            except ImportError:
+                ORTModelForSeq2SeqLM = None
+        return _HAVE_TRANSFORMERS
+
+
+def _load_ocr() -> bool:
+    """Import pytesseract and pdf2image once per process."""
+    global _HAVE_OCR, pytesseract, convert_from_path
+    with _import_lock:
+        if _HAVE_OCR is None:
+            try:
+                import pytesseract
+                from pdf2image import convert_from_path
+                _HAVE_OCR = True
+            except ImportError:
+                _HAVE_OCR = False
+        return _HAVE_OCR
 
 
 # --- Step A: Extract text ---
-def extract_text_from_pdf(path: str) -> str:
-    print(">> Extracting text from PDF...")
-    if PdfReader is None:
-        print("PyPDF2 not installed -> cannot extract text.")
+# OCR settings: pages are rendered one at a time inside the worker processes,
+# so peak memory is roughly OCR_WORKERS rendered pages regardless of length.
+OCR_WORKERS = int(os.environ.get("PRISMATA_OCR_WORKERS", "0")) or os.cpu_count() or 1
+OCR_DPI = int(os.environ.get("PRISMATA_OCR_DPI", "200"))
+# "pages": OCR every page whose text layer is empty.
+# "fallback": OCR only when the whole document has no text layer.
+OCR_MODE = os.environ.get("PRISMATA_OCR_MODE", "pages")
+
+
+def _ocr_page(path: str, page_number: int, dpi: int = OCR_DPI) -> str:
+    """Render a single (1-based) page and OCR it. Runs in a worker process."""
+    # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    if not _load_ocr():
+        return ""
+    try:
+        images = convert_from_path(path, dpi=dpi, first_page=page_number,
+                                   last_page=page_number, grayscale=True)
+        return "\n".join(pytesseract.image_to_string(img) for img in images)
+    except Exception as e:
+        log.warning("OCR failed on page %d: %s", page_number, e)
         return ""
 
-    reader = PdfReader(path)
-    texts = []
-    for page in reader.pages:
-        try:
-            txt = page.extract_text() or ""
-            texts.append(txt)
-        except Exception:
-            texts.append("")
+
+def ocr_pages(path: str, page_numbers) -> dict:
+    """OCR the given 1-based page numbers in parallel; returns {page: text}."""
+    page_numbers = list(page_numbers)
+    if not page_numbers:
+        return {}
+    workers = min(OCR_WORKERS, len(page_numbers))
+    if workers == 1:
+        return {n: _ocr_page(path, n) for n in page_numbers}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        texts = pool.map(_ocr_page, [path] * len(page_numbers), page_numbers)
+        return dict(zip(page_numbers, texts))
+
+
+def iter_pdf_pages(path: str, reader=None):
+    """Lazily yield (page_number, text) from the PDF's text layer, 1-based (see extraction)."""
+    for page in iter_pages(path, reader=reader):
+        yield page.number, page.text
+
+
+def extract_text_from_pdf(path: str, reader=None) -> str:
+    """`reader` may be a PdfReader already open on `path` (e.g. over an mmap)."""
+    return extract_text_and_page_count(path, reader=reader)[0]
+
+
+def extract_text_and_page_count(path: str, reader=None):
+    """(text, number of pages) of the PDF; see extract_text_from_pdf."""
+    log.debug("Extracting text from %s", path)
+    pages = extract_pages(path, reader=reader)
+    texts = [page.text for page in pages]
     result = "\n".join(texts).strip()
-    if result:
-        print("   Extracted text successfully using PyPDF2.")
-        return result
-
-    # fallback OCR
-    if pytesseract and convert_from_path:
-        print("   No text found, trying OCR fallback...")
-        # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-        pages = convert_from_path(path)
-        ocr_texts = []
-        for p in pages:
-            txt = pytesseract.image_to_string(p)
-            ocr_texts.append(txt)
-        result = "\n".join(ocr_texts).strip()
+
+    empty_pages = [i + 1 for i, txt in enumerate(texts) if not txt.strip()]
+    if result and (OCR_MODE == "fallback" or not empty_pages):
+        log.debug("Extracted text layer using %s.", sorted({p.engine for p in pages if p.engine}))
+        return result, len(pages)
+
+    # OCR pages without a text layer
+    if empty_pages and _load_ocr():
+        log.info("No text on %d of %d pages, running OCR with %d workers",
+                 len(empty_pages), len(texts), min(OCR_WORKERS, len(empty_pages)))
+        for page_number, txt in ocr_pages(path, empty_pages).items():
+            texts[page_number - 1] = txt
+        result = "\n".join(texts).strip()
         if result:
-            print("   OCR successful.")
-            return result
-    print("   Extraction failed, returning empty text.")
-    return ""
+            log.debug("OCR successful.")
+            return result, len(pages)
+    if result:
+        log.warning("Extracted text layer only (OCR unavailable for empty pages).")
+        return result, len(pages)
+    log.warning("Extraction failed for %s, returning empty text.", path)
+    return "", len(pages)
 
 
 # --- Step B: Language detection ---
-def detect_language(text: str):
-    print(">> Detecting language...")
-    if detect:
-        try:
-            lang = detect(text)
-            print(f"   Detected language: {lang}")
-            return lang
-        except Exception as e:
-            print("   Language detection failed:", e)
-            return None
-    else:
-        print("   langdetect not installed -> skipping.")
+# langdetect's cost grows with the text and it is randomized, so detection
+# runs on a bounded sample spread over the document with a fixed seed (same
+# text -> same answer). Profiles are loaded once per process.
+LANGUAGE_SAMPLE_CHARS = int(os.environ.get("PRISMATA_LANGUAGE_SAMPLE_CHARS", "2000"))
+LANGUAGE_SAMPLE_WINDOWS = 8
+PAGE_LANGUAGE_CHARS = 400
+MIN_LANGUAGE_LETTERS = 20
+LANGDETECT_SEED = 0
+
+_language_factory = None
+_language_factory_lock = threading.Lock()
+
+
+def _get_language_factory():
+    """The seeded langdetect factory, or None when langdetect is not installed."""
+    global _language_factory
+    with _language_factory_lock:
+        if _language_factory is None:
+            try:
+                from langdetect import DetectorFactory
+                from langdetect.detector_factory import PROFILES_DIRECTORY
+            except ImportError:
+                return None
+            factory = DetectorFactory()
+            factory.load_profile(PROFILES_DIRECTORY)
+            factory.seed = LANGDETECT_SEED
+            _language_factory = factory
+        return _language_factory
+
+
+def _central_window(text: str, max_chars: int) -> str:
+    """Up to max_chars from the middle of text (skips letterheads and footers)."""
+    if len(text) <= max_chars:
+        return text
+    start = (len(text) - max_chars) // 2
+    window = text[start:start + max_chars]
+    # Drop the partial words at both ends, unless that would leave nothing
+    # (e.g. a scanned page with a few stray characters)
+    if len(window.split(None, 2)) < 3:
+        return window.strip()
+    return window.split(None, 1)[1].rsplit(None, 1)[0]
+
+
+def sample_text(pages, max_chars=LANGUAGE_SAMPLE_CHARS, windows=LANGUAGE_SAMPLE_WINDOWS) -> str:
+    """
+    At most max_chars of text taken from up to `windows` evenly spaced pages
+    (or evenly spaced slices of a single string).
+    """
+    if isinstance(pages, str):
+        text = pages.strip()
+        if len(text) <= max_chars:
+            return text
+        step = len(text) // windows
+        pages = [text[i * step:(i + 1) * step] for i in range(windows)]
+    pages = [p for p in pages if p and p.strip()]
+    if not pages:
+        return ""
+    if len(pages) > windows:
+        step = len(pages) / windows
+        pages = [pages[int(i * step)] for i in range(windows)]
+    budget = max_chars // len(pages)
+    return "\n".join(_central_window(p.strip(), budget) for p in pages)
+
+
+def _detect_sample(sample: str):
+    if sum(c.isalpha() for c in sample) < MIN_LANGUAGE_LETTERS:
+        return None, 0.0
+    factory = _get_language_factory()
+    if factory is None:
+        return None, 0.0
+    try:
+        detector = factory.create()
+        detector.append(sample)
+        best = detector.get_probabilities()[0]
+        return best.lang, best.prob
+    except Exception as e:
+        log.warning("Language detection failed: %s", e)
+        return None, 0.0
+
+
+def detect_language_with_confidence(text):
+    """(language, probability) for a text or a list of page texts, or (None, 0.0)."""
+    return _detect_sample(sample_text(text))
+
+
+def detect_language(text):
+    if _get_language_factory() is None:
+        log.warning("langdetect not installed -> skipping language detection.")
         return None
+    lang, confidence = detect_language_with_confidence(text)
+    log.debug("Detected language: %s (%.2f)", lang, confidence)
+    return lang
+
+
+def detect_page_languages(pages):
+    """
+    [(language, probability)] for each page, from a short sample of the page.
+    Pages with too little text get (None, 0.0).
+    """
+    return [_detect_sample(_central_window(p.strip(), PAGE_LANGUAGE_CHARS)) for p in pages]
 
 
 # --- Step C: Local LLM wrapper ---
+SUMMARIZER_MODEL = "google/flan-t5-base"
+MAX_INPUT_TOKENS = 512
+BATCH_SIZE = int(os.environ.get("PRISMATA_BATCH_SIZE", "8"))
+# Long-document summarization: token budget per chunk, tokens repeated between
+# neighbouring chunks, and how many summary-of-summaries rounds are allowed.
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("PRISMATA_SUMMARY_CHUNK_TOKENS", "480"))
+SUMMARY_CHUNK_OVERLAP = int(os.environ.get("PRISMATA_SUMMARY_CHUNK_OVERLAP", "32"))
+SUMMARY_MAX_DEPTH = int(os.environ.get("PRISMATA_SUMMARY_MAX_DEPTH", "3"))
+
+# How flan-t5 runs: "torch" (eager fp32), "int8" (dynamically quantized Linear
+# layers, CPU only) or "onnx" (ONNX Runtime; exported once into ONNX_DIR).
+INFERENCE_BACKEND = os.environ.get("PRISMATA_INFERENCE_BACKEND", "torch")
+INFERENCE_BACKENDS = ("torch", "int8", "onnx")
+ONNX_DIR = os.environ.get(
+    "PRISMATA_ONNX_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "onnx")
+)
+
+# Sentence ends (including the Devanagari danda), blank lines and page breaks
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?\u0964])\s+|\n\s*\n|\f")
+# Bump when prompts, keyword rules or pipeline logic change the derived fields
+PIPELINE_VERSION = "1"
+# Bump one of these to mark only that field stale (see reprocess.py)
+TRANSLATION_VERSION = "1"
+SUMMARY_VERSION = "1"
+CLASSIFICATION_VERSION = "1"
+
+
+def derived_field_versions(llm=None) -> dict:
+    """
+    {field: version} for each derived field, naming the pipeline, prompt and
+    models that produce it. Summary and label are computed from the
+    translated text, so their versions include the translation's. When `llm`
+    is given but not loaded, summary and label came from fallbacks and get a
+    distinct version, so reprocessing picks them up later.
+
+    With a model server, the model names and backend are the ones the server
+    reports on /health (the local settings may differ); while it cannot be
+    reached, the local settings stand in for them.
+    """
+    given = llm is not None
+    translator, large = TRANSLATION_MODEL if TRANSLATION_ENABLED else None, LARGE_CLASSIFIER_MODEL
+    if MODEL_SERVER_URL:
+        # Thin clients, so this loads nothing
+        llm = llm or get_llm()
+        remote_large = get_large_llm()
+        if remote_large.info:
+            large = remote_large.model_name
+        if TRANSLATION_ENABLED and get_model("translator").info:
+            translator = get_model("translator").model_name
+    summarizer = f"{SUMMARIZER_MODEL}/{INFERENCE_BACKEND}"
+    if llm is not None and llm.model_name:
+        summarizer = f"{llm.model_name}/{llm.backend}"
+    if given and not llm.loaded:
+        summarizer = "unavailable"
+    translation = (f"pipeline={PIPELINE_VERSION};translation={TRANSLATION_VERSION};"
+                   f"translator={translator or 'none'}")
+    return {
+        "translated_text": translation,
+        "summary": f"{translation};summary={SUMMARY_VERSION};summarizer={summarizer}",
+        "department_label": (f"{translation};classification={CLASSIFICATION_VERSION};"
+                             f"classifier={summarizer}+{large or 'none'}@{CASCADE_CONFIDENCE};"
+                             f"keywords={get_keyword_classifier().version}"),
+    }
+
+
+def model_version_key() -> str:
+    """Identifies the models/pipeline that produce a result (used for caching)."""
+    versions = derived_field_versions()
+    return hashlib.sha256("\n".join(versions[f] for f in VERSIONED_FIELDS).encode("utf-8")).hexdigest()[:16]
+
+
+def _load_seq2seq(model_name, backend):
+    """flan-t5 weights for the given inference backend (see INFERENCE_BACKEND)."""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of {INFERENCE_BACKENDS})")
+
+    if backend == "onnx":
+        if ORTModelForSeq2SeqLM is None:
+            raise ImportError("ONNX backend needs optimum[onnxruntime]")
+        export_dir = os.path.join(ONNX_DIR, model_name.replace("/", "--"))
+        if os.path.exists(os.path.join(export_dir, "config.json")):
+            # Encoder/decoder sessions are created once here and kept by the registry
+            return ORTModelForSeq2SeqLM.from_pretrained(export_dir, provider="CPUExecutionProvider")
+        log.info("Exporting %s to ONNX in %s (one-off)", model_name, export_dir)
+        model = ORTModelForSeq2SeqLM.from_pretrained(
+            model_name, export=True, local_files_only=True, provider="CPUExecutionProvider"
+        )
+        model.save_pretrained(export_dir)
+        return model
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name, local_files_only=True)
+    model.eval()
+    if backend == "int8":
+        # Weights of every Linear layer stored as int8, activations quantized on the fly
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
 class LocalLLM:
-    def __init__(self):
+    def __init__(self, model_name=SUMMARIZER_MODEL, backend=INFERENCE_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
         self.loaded = False
         self.summarizer = None
         self.flantokenizer = None
@@ -104,23 +383,24 @@ class LocalLLM:
         self.indic_tokenizer = None
         self.indic_model = None
         self.indic_processor = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # Quantized and ONNX Runtime models are CPU-only
+        self.device = "cuda" if backend == "torch" and _load_transformers() and torch.cuda.is_available() else "cpu"
+        # The registry shares one instance across request threads; generate()
+        # and the HF pipeline are not re-entrant, so inference is serialized.
+        self.lock = threading.RLock()
 
-        if _HAVE_TRANSFORMERS:
+        if _load_transformers():
             try:
-                # Load flan-t5-base for summarization & classification
-                model_name = "google/flan-t5-base"
+                # Load flan-t5 for summarization & classification
                 self.flantokenizer = AutoTokenizer.from_pretrained(
                     model_name, local_files_only=True
                 )
-                self.flanmodel = AutoModelForSeq2SeqLM.from_pretrained(
-                    model_name, local_files_only=True
-                )
+                self.flanmodel = _load_seq2seq(model_name, backend)
                 self.summarizer = pipeline(
                     "summarization",
                     model=self.flanmodel,
                     tokenizer=self.flantokenizer,
-                    device=0 if torch.cuda.is_available() else -1
+                    device=0 if self.device == "cuda" else -1
                 )
 
                 # # Load IndicTrans2 for translation
@@ -132,81 +412,609 @@ class LocalLLM:
                 # self.indic_processor = IndicProcessor(inference=True)
 
                 self.loaded = True
-                print(">> Local models loaded: flan-t5-base + indictrans2-indic-en-dist-200M")
+                log.info("Local models loaded: %s (%s)", model_name, backend)
             except Exception as e:
-                print(">> Could not load local models:", e)
+                log.error("Could not load local models: %s", e)
 
-    def summarize(self, text: str) -> str:
+    def summarize(self, text: str, chunk_tokens=SUMMARY_CHUNK_TOKENS,
+                  overlap_tokens=SUMMARY_CHUNK_OVERLAP, max_depth=SUMMARY_MAX_DEPTH) -> str:
         if not self.summarizer:
-            print("   No summarizer -> fallback (keep text unchanged).")
+            log.warning("No summarizer -> fallback (keep text unchanged).")
             return text
         try:
-            out = self.summarizer(text, max_length=300, min_length=30, do_sample=False)
-            return out[0]["summary_text"]
+            chunks = self.chunk_text(text, chunk_tokens, overlap_tokens)
+            first = next(chunks, None)
+            second = next(chunks, None)
+            if second is None:
+                # Fits in a single model input: one pass, no chunking overhead
+                with self.lock:
+                    out = self.summarizer(first or text, max_length=300, min_length=30, do_sample=False)
+                summary = out[0]["summary_text"]
+                record_tokens(self.model_name, "input", len(self.flantokenizer(first or text)["input_ids"]))
+                record_tokens(self.model_name, "output", len(self.flantokenizer(summary)["input_ids"]))
+                return summary
+            return self._reduce_summaries(
+                self._map_summaries([first, second], chunks),
+                chunk_tokens, overlap_tokens, max_depth
+            )
         except Exception as e:
-            print("   Summarization failed -> fallback:", e)
+            log.warning("Summarization failed -> fallback: %s", e)
             return text
 
-    # def translate_to_en(self, text: str, src_lang="hin_Deva") -> str:
-    #     """Translate text from any Indic language to English using IndicTrans2."""
-    #     if not self.indic_model or not self.indic_processor:
-    #         print("   No translator -> fallback (return original text).")
-    #         return text
-    #     try:
-    #         # Preprocess
-    #         batch = self.indic_processor.preprocess_batch(
-    #             [text],
-    #             src_lang=src_lang,
-    #             tgt_lang="eng_Latn"
-    #         )
+    def chunk_text(self, text: str, chunk_tokens=SUMMARY_CHUNK_TOKENS,
+                   overlap_tokens=SUMMARY_CHUNK_OVERLAP):
+        """
+        Lazily yield pieces of `text` of at most chunk_tokens tokens, cut at
+        sentence/page boundaries. The last sentences of each chunk (up to
+        overlap_tokens) are repeated at the start of the next one.
+        """
+        sentences = (s.strip() for s in _SENTENCE_BOUNDARY.split(text))
+        current, current_tokens = [], 0
+        for sentence in sentences:
+            if not sentence:
+                continue
+            ids = self.flantokenizer(sentence, add_special_tokens=False)["input_ids"]
+            # A single over-long "sentence" (tables, OCR noise) is cut by tokens
+            pieces = [ids[i:i + chunk_tokens] for i in range(0, len(ids), chunk_tokens)]
+            for piece in pieces:
+                piece_text = sentence if len(pieces) == 1 else self.flantokenizer.decode(piece)
+                if current and current_tokens + len(piece) > chunk_tokens:
+                    yield " ".join(t for t, _ in current)
+                    carried, carried_tokens = [], 0
+                    budget = min(overlap_tokens, chunk_tokens - len(piece))
+                    for t, n in reversed(current):
+                        if carried_tokens + n > budget:
+                            break
+                        carried.insert(0, (t, n))
+                        carried_tokens += n
+                    current, current_tokens = carried, carried_tokens
+                current.append((piece_text, len(piece)))
+                current_tokens += len(piece)
+        if current:
+            yield " ".join(t for t, _ in current)
 
-    #         # Translate
-    #         translations = self.indic_model.translate(batch)
+    def _map_summaries(self, head, chunks):
+        """Summarize chunks batch by batch so only the summaries are kept."""
+        summaries, batch = [], list(head)
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= BATCH_SIZE:
+                summaries.extend(self.summarize_batch(batch))
+                batch = []
+        if batch:
+            summaries.extend(self.summarize_batch(batch))
+        log.debug("Summarized %d chunks.", len(summaries))
+        return summaries
 
-    #         # Postprocess
-    #         translations = self.indic_processor.postprocess_batch(translations, lang="eng_Latn")
-    #         return translations[0]
-    #     except Exception as e:
-    #         print("   Translation failed -> fallback:", e)
-    #         return text
+    def _reduce_summaries(self, summaries, chunk_tokens, overlap_tokens, max_depth):
+        """Summarize the chunk summaries until they fit one input (or depth runs out)."""
+        for depth in range(1, max_depth + 1):
+            combined = "\n".join(summaries)
+            chunks = list(self.chunk_text(combined, chunk_tokens, 0))
+            if len(chunks) <= 1 or depth == max_depth:
+                # Final pass; beyond max_depth the input is truncated by the tokenizer
+                return self.summarize_batch([combined])[0]
+            summaries = self.summarize_batch(chunks)
+            log.debug("Reduce level %d: %d summaries.", depth, len(summaries))
+        return "\n".join(summaries)
 
+    def generate_batch(self, prompts, max_length, min_length=0, batch_size=BATCH_SIZE):
+        """
+        Run flan-t5 over many prompts at once. Prompts are tokenized once,
+        sorted by token length so each padded batch wastes little work, and
+        the decoded outputs are returned in input order.
+        """
+        encoded = self.flantokenizer(
+            list(prompts), truncation=True, max_length=MAX_INPUT_TOKENS
+        )["input_ids"]
+        order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+        outputs = [None] * len(encoded)
+
+        for start in range(0, len(order), batch_size):
+            group = order[start:start + batch_size]
+            inputs = self.flantokenizer.pad(
+                {"input_ids": [encoded[i] for i in group]}, return_tensors="pt"
+            ).to(self.device)
+            with self.lock, torch.inference_mode():
+                generated = self.flanmodel.generate(
+                    **inputs, max_length=max_length, min_length=min_length, do_sample=False
+                )
+            record_tokens(self.model_name, "input", inputs["attention_mask"].sum())
+            record_tokens(self.model_name, "output", (generated != self.flantokenizer.pad_token_id).sum())
+            decoded = self.flantokenizer.batch_decode(generated, skip_special_tokens=True)
+            for i, text in zip(group, decoded):
+                outputs[i] = text
+        return outputs
+
+    def score_labels(self, prompts, labels, batch_size=BATCH_SIZE):
+        """
+        Probability of each fixed label as the answer to each prompt, from a
+        single encoder pass per prompt and one teacher-forced decoder pass
+        over all labels (no autoregressive generation). Returns a
+        (len(prompts), len(labels)) numpy array whose rows sum to 1.
+        """
+        label_ids = self.flantokenizer(list(labels), padding=True, return_tensors="pt")["input_ids"]
+        label_ids = label_ids.masked_fill(label_ids == self.flantokenizer.pad_token_id, -100)
+        n_labels = len(labels)
+        encoded = self.flantokenizer(
+            list(prompts), truncation=True, max_length=MAX_INPUT_TOKENS
+        )["input_ids"]
+        order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+        scores = np.zeros((len(encoded), n_labels), dtype=np.float32)
+        record_tokens(self.model_name, "input", sum(len(ids) for ids in encoded))
+
+        for start in range(0, len(order), batch_size):
+            group = order[start:start + batch_size]
+            inputs = self.flantokenizer.pad(
+                {"input_ids": [encoded[i] for i in group]}, return_tensors="pt"
+            ).to(self.device)
+            with self.lock, torch.inference_mode():
+                encoder = (self.flanmodel.get_encoder() if hasattr(self.flanmodel, "get_encoder")
+                           else self.flanmodel.encoder)
+                encoder_out = encoder(
+                    input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]
+                )
+                # Every prompt is paired with every label: (batch * labels) rows
+                hidden = encoder_out.last_hidden_state.repeat_interleave(n_labels, dim=0)
+                mask = inputs["attention_mask"].repeat_interleave(n_labels, dim=0)
+                targets = label_ids.repeat(len(group), 1).to(self.device)
+                # Teacher forcing: the decoder sees <start> + label[:-1]. Built by
+                # hand because ONNX Runtime models do not shift `labels` themselves.
+                start_ids = torch.full((len(targets), 1), self.flanmodel.config.decoder_start_token_id,
+                                       dtype=targets.dtype, device=targets.device)
+                decoder_input_ids = torch.cat([start_ids, targets[:, :-1]], dim=1)
+                decoder_input_ids = decoder_input_ids.masked_fill(
+                    decoder_input_ids == -100, self.flantokenizer.pad_token_id
+                )
+                logits = self.flanmodel(
+                    encoder_outputs=BaseModelOutput(last_hidden_state=hidden),
+                    attention_mask=mask, decoder_input_ids=decoder_input_ids
+                ).logits
+                log_probs = torch.log_softmax(logits.float(), dim=-1)
+                valid = targets != -100
+                token_log_probs = log_probs.gather(-1, targets.clamp(min=0).unsqueeze(-1)).squeeze(-1)
+                sequence_log_probs = (token_log_probs * valid).sum(dim=-1).view(len(group), n_labels)
+                probs = torch.softmax(sequence_log_probs, dim=-1)
+            scores[group] = probs.cpu().numpy()
+        return scores
+
+    def summarize_many(self, texts, batch_size=BATCH_SIZE):
+        """
+        Summaries of whole documents, in input order: documents that fit one
+        model input share batches, longer ones go through summarize().
+        """
+        texts = list(texts)
+        summaries = [None] * len(texts)
+        short = []
+        for i, text in enumerate(texts):
+            if self.flantokenizer and next(islice(self.chunk_text(text), 1, None), None) is not None:
+                # Longer than one model input: chunked map-reduce instead of truncation
+                summaries[i] = self.summarize(text)
+            else:
+                short.append(i)
+        for i, summary in zip(short, self.summarize_batch([texts[i] for i in short], batch_size=batch_size)):
+            summaries[i] = summary
+        return summaries
+
+    def summarize_batch(self, texts, batch_size=BATCH_SIZE):
+        """Summarize many documents in length-grouped batches (input order kept)."""
+        texts = list(texts)
+        if not self.flanmodel:
+            log.warning("No summarizer -> fallback (keep text unchanged).")
+            return texts
+        try:
+            # Same task prefix the summarization pipeline adds for T5 models
+            prompts = [f"summarize: {t}" for t in texts]
+            return self.generate_batch(prompts, max_length=300, min_length=30, batch_size=batch_size)
+        except Exception as e:
+            log.warning("Batch summarization failed -> fallback: %s", e)
+            return texts
 
 
 # --- Step D: Classification ---
 def classify_with_keywords(text: str) -> str:
-    t = text.lower()
-    if any(w in t for w in ["invoice", "bill", "payment", "amount"]):
-        return "Finance"
-    if any(w in t for w in ["training", "employee", "staff", "hr"]):
-        return "HR"
-    if any(w in t for w in ["operations", "job card", "engine", "overhaul"]):
-        return "Operations"
-    if any(w in t for w in ["safety", "circular", "hazard", "alert"]):
-        return "Safety"
-    if any(w in t for w in ["purchase order", "vendor", "procurement"]):
-        return "Procurement"
-    return "Other"
+    label, _, _ = get_keyword_classifier().classify(text)
+    return label
+
+
+DEPARTMENTS = ["Finance", "HR", "Operations", "Safety", "Procurement", "Other"]
+
+
+def _classification_prompt(text: str) -> str:
+    return f"Which of these departments is this message suited for? [Finance, HR, Operations, Safety, Procurement, Other]:\n\n{text[:1000]}"
+
+
+# Classification cascade: keyword rules -> flan-t5 label scoring -> optional
+# larger model for documents the base model is unsure about.
+LARGE_CLASSIFIER_MODEL = os.environ.get("PRISMATA_LARGE_CLASSIFIER_MODEL")  # e.g. google/flan-t5-large
+CASCADE_CONFIDENCE = float(os.environ.get("PRISMATA_CASCADE_CONFIDENCE", "0.6"))
+
+
+class CascadeStats:
+    """Per-tier counters: documents seen, documents decided, time spent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers = {}
+
+    def record(self, tier, seen, decided, seconds):
+        with self._lock:
+            stats = self._tiers.setdefault(tier, {"seen": 0, "decided": 0, "seconds": 0.0})
+            stats["seen"] += seen
+            stats["decided"] += decided
+            stats["seconds"] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            total = max((t["seen"] for t in self._tiers.values()), default=0)
+            return {
+                tier: {
+                    **stats,
+                    "seconds": round(stats["seconds"], 3),
+                    "hit_rate": round(stats["decided"] / stats["seen"], 3) if stats["seen"] else None,
+                    "ms_per_doc": round(1000 * stats["seconds"] / stats["seen"], 2) if stats["seen"] else None,
+                    # Share of all documents that never needed this tier or a later one
+                    "skipped_share": round(1 - stats["seen"] / total, 3) if total else None,
+                }
+                for tier, stats in self._tiers.items()
+            }
+
+
+cascade_stats = CascadeStats()
+Gauge("prismata_classifier_documents", "Documents seen per classification cascade tier",
+      lambda: {tier: stats["seen"] for tier, stats in cascade_stats.snapshot().items()}, labels=("tier",))
+Gauge("prismata_classifier_decided", "Documents decided per classification cascade tier",
+      lambda: {tier: stats["decided"] for tier, stats in cascade_stats.snapshot().items()}, labels=("tier",))
+
+
+def _score_tier(tier, llm, texts, indices, batch_size, final):
+    """Label-score texts[indices]; returns {index: (label, probability)} it decided."""
+    start = time.perf_counter()
+    decided = {}
+    try:
+        probs = llm.score_labels([_classification_prompt(texts[i]) for i in indices],
+                                 DEPARTMENTS, batch_size=batch_size)
+        for i, row in zip(indices, probs):
+            best = int(row.argmax())
+            if final or row[best] >= CASCADE_CONFIDENCE:
+                decided[i] = (DEPARTMENTS[best], float(row[best]))
+    except Exception as e:
+        log.warning("%s classification failed -> fallback: %s", tier, e)
+    cascade_stats.record(tier, len(indices), len(decided), time.perf_counter() - start)
+    return decided
+
+
+def get_large_llm():
+    """The tier-3 classifier model, or None when none is configured."""
+    return get_model("llm_large") if LARGE_CLASSIFIER_MODEL or MODEL_SERVER_URL else None
+
+
+def classify_cascade(texts, llm=None, batch_size=BATCH_SIZE):
+    """
+    [(label, tier, confidence)] for each text, in input order. Each tier only
+    sees the documents the previous tiers could not decide confidently.
+    """
+    texts = list(texts)
+    results = [None] * len(texts)
+
+    # Tier 1: keyword rules
+    start = time.perf_counter()
+    keyword_results = [get_keyword_classifier().classify(t) for t in texts]
+    pending = []
+    for i, (label, confident, _) in enumerate(keyword_results):
+        if confident:
+            results[i] = (label, "keywords", 1.0)
+        else:
+            pending.append(i)
+    cascade_stats.record("keywords", len(texts), len(texts) - len(pending), time.perf_counter() - start)
+
+    # Tier 2: flan-t5 log-likelihood of each label
+    if pending:
+        if llm is None:
+            llm = get_llm()
+        if llm and llm.loaded:
+            large = get_large_llm()
+            have_large = bool(large and large.loaded)
+            decided = _score_tier("flan_scoring", llm, texts, pending, batch_size, final=not have_large)
+            for i, (label, prob) in decided.items():
+                results[i] = (label, "flan_scoring", prob)
+            pending = [i for i in pending if i not in decided]
+
+            # Tier 3: larger model for the ambiguous remainder
+            if pending and have_large:
+                decided = _score_tier("large_model", large, texts, pending, batch_size, final=True)
+                for i, (label, prob) in decided.items():
+                    results[i] = (label, "large_model", prob)
+                pending = [i for i in pending if i not in decided]
+
+    # No model available (or it failed): best keyword guess
+    for i in pending:
+        results[i] = (keyword_results[i][0], "keywords_fallback", 0.0)
+    return results
 
 
 def classify_text(text: str, llm=None) -> str:
-    print(">> Classifying text...")
-    if llm and llm.flantokenizer and llm.flanmodel:
+    label, tier, confidence = classify_cascade([text], llm=llm, batch_size=1)[0]
+    log.debug("Classified by %s: %s (%.2f)", tier, label, confidence)
+    return label
+
+
+def classify_texts(texts, llm=None, batch_size=BATCH_SIZE):
+    """Batched classify_text: one label per input text, in input order."""
+    texts = list(texts)
+    log.debug("Classifying %d texts in batches of %d", len(texts), batch_size)
+    results = classify_cascade(texts, llm=llm, batch_size=batch_size)
+    return [label for label, _, _ in results]
+
+
+def summarize_and_classify_batch(texts, llm=None, batch_size=BATCH_SIZE):
+    """
+    Summaries and labels for many documents. Each task runs as shared
+    multi-document batches, so the models see batch_size documents per
+    generate() call instead of one. Results are in input order.
+    """
+    texts = list(texts)
+    if llm is None:
+        llm = get_llm()
+    summaries = llm.summarize_many(texts, batch_size=batch_size)
+    labels = classify_texts(texts, llm=llm, batch_size=batch_size)
+    return [
+        {"summary": summary, "department_label": label}
+        for summary, label in zip(summaries, labels)
+    ]
+
+
+# --- Step E: Embeddings for semantic search ---
+EMBEDDING_MODEL = os.environ.get(
+    "PRISMATA_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+EMBEDDING_CHUNK_WORDS = 180
+EMBEDDING_MAX_CHUNKS = 64
+EMBEDDING_BATCH_SIZE = 32
+
+
+class LocalEmbedder:
+    """Multilingual sentence encoder (mean-pooled transformer, unit-length output)."""
+
+    def __init__(self):
+        self.tokenizer = None
+        self.model = None
+        self.dim = None
+        self.lock = threading.RLock()
+
+        if np is not None and _load_transformers():
+            try:
+                self.tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL, local_files_only=True)
+                self.model = AutoModel.from_pretrained(EMBEDDING_MODEL, local_files_only=True)
+                self.model.eval()
+                self.dim = self.model.config.hidden_size
+                log.info("Embedding model loaded: %s", EMBEDDING_MODEL)
+            except Exception as e:
+                log.error("Could not load embedding model: %s", e)
+
+    def encode(self, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        """float32 array of shape (len(texts), dim), rows L2-normalized."""
+        texts = list(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        # Length-sorted batches keep padding small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            group = order[start:start + batch_size]
+            inputs = self.tokenizer(
+                [texts[i] for i in group], padding=True, truncation=True,
+                max_length=256, return_tensors="pt"
+            )
+            with self.lock, torch.inference_mode():
+                hidden = self.model(**inputs).last_hidden_state
+            record_tokens(EMBEDDING_MODEL, "input", inputs["attention_mask"].sum())
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            pooled = torch.nn.functional.normalize(pooled, dim=-1)
+            vectors[group] = pooled.numpy()
+        return vectors
+
+
+def embedding_chunks(text: str, words=EMBEDDING_CHUNK_WORDS, max_chunks=EMBEDDING_MAX_CHUNKS):
+    """Split text into word windows for embedding, capped per document."""
+    tokens = text.split()
+    chunks = [" ".join(tokens[i:i + words]) for i in range(0, len(tokens), words)]
+    if len(chunks) > max_chunks:
+        # Spread the budget over the whole document rather than its start
+        step = len(chunks) / max_chunks
+        chunks = [chunks[int(i * step)] for i in range(max_chunks)]
+    return chunks
+
+
+def embed_text(text: str, embedder=None):
+    """Chunk vectors for one document, or None if no encoder/text is available."""
+    if embedder is None:
+        embedder = get_embedder()
+    chunks = embedding_chunks(text)
+    if not embedder.model or not chunks:
+        return None
+    try:
+        return embedder.encode(chunks)
+    except Exception as e:
+        log.warning("Embedding failed -> skipping: %s", e)
+        return None
+
+
+# --- Step F: Translation to English ---
+TRANSLATION_ENABLED = os.environ.get("PRISMATA_TRANSLATION", "0") == "1"
+TRANSLATION_MODEL = os.environ.get("PRISMATA_TRANSLATION_MODEL", "facebook/m2m100_418M")
+TRANSLATION_BATCH_SIZE = int(os.environ.get("PRISMATA_TRANSLATION_BATCH_SIZE", "16"))
+TRANSLATION_NUM_BEAMS = int(os.environ.get("PRISMATA_TRANSLATION_BEAMS", "2"))
+TRANSLATION_MAX_TOKENS = 256
+# Language tags below this probability are not trusted to pick (or skip) a translation
+TRANSLATE_MIN_CONFIDENCE = float(os.environ.get("PRISMATA_TRANSLATE_MIN_CONFIDENCE", "0.7"))
+
+# Sentence ends, line breaks and page breaks; the separators are kept (capture
+# group) so the translated text has the same line and page layout.
+_TRANSLATION_SPLIT = re.compile(r"((?<=[.!?\u0964])[ \t]+|[ \t]*\n\s*|\f)")
+_LETTER = re.compile(r"[^\W\d_]")
+_NON_LATIN_LETTER = re.compile(r"[^\W\d_a-zA-Z\u00C0-\u024F]")
+_ENGLISH_WORD = re.compile(r"[a-z]+")
+# Common English words that are not also common words of other Latin-script
+# languages ("a", "in", "on", "or", "an", ... are left out)
+_ENGLISH_STOPWORDS = frozenset("""
+    the and of to for with from this that these those is are was were be been
+    has have had will shall should must would can which who not by at its it
+    their our your they we you all any per than into
+""".split())
+
+
+class LocalTranslator:
+    """M2M100 many-to-English translator, run on batches of sentences."""
+
+    def __init__(self):
+        self.model_name = TRANSLATION_MODEL
+        self.tokenizer = None
+        self.model = None
+        # The tokenizer's src_lang is shared state, so one batch at a time
+        self.lock = threading.RLock()
+
+        if _load_transformers():
+            try:
+                self.tokenizer = M2M100Tokenizer.from_pretrained(TRANSLATION_MODEL, local_files_only=True)
+                self.model = M2M100ForConditionalGeneration.from_pretrained(TRANSLATION_MODEL, local_files_only=True)
+                self.model.eval()
+                log.info("Translation model loaded: %s", TRANSLATION_MODEL)
+            except Exception as e:
+                log.error("Could not load translation model: %s", e)
+
+    def supports(self, lang):
+        return bool(self.model) and lang in self.tokenizer.lang_code_to_id
+
+    def translate_batch(self, sentences, src_lang, batch_size=TRANSLATION_BATCH_SIZE):
+        """English translations of `sentences`, in input order."""
+        sentences = list(sentences)
+        outputs = [None] * len(sentences)
+        # Length-sorted batches keep padding (and wasted decoder steps) small
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        with self.lock:
+            self.tokenizer.src_lang = src_lang
+            for start in range(0, len(order), batch_size):
+                group = order[start:start + batch_size]
+                inputs = self.tokenizer(
+                    [sentences[i] for i in group], padding=True, truncation=True,
+                    max_length=TRANSLATION_MAX_TOKENS, return_tensors="pt"
+                )
+                with torch.inference_mode():
+                    generated = self.model.generate(
+                        **inputs, forced_bos_token_id=self.tokenizer.get_lang_id("en"),
+                        max_length=TRANSLATION_MAX_TOKENS, num_beams=TRANSLATION_NUM_BEAMS
+                    )
+                record_tokens(TRANSLATION_MODEL, "input", inputs["attention_mask"].sum())
+                record_tokens(TRANSLATION_MODEL, "output", (generated != self.tokenizer.pad_token_id).sum())
+                decoded = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+                for i, text in zip(group, decoded):
+                    outputs[i] = text
+        return outputs
+
+
+def _uses_latin_script(text):
+    sample = sample_text(text)
+    return len(_NON_LATIN_LETTER.findall(sample)) * 2 < len(_LETTER.findall(sample))
+
+
+def _looks_english(sentence):
+    words = _ENGLISH_WORD.findall(sentence.lower())
+    hits = sum(word in _ENGLISH_STOPWORDS for word in words)
+    return hits >= 2 and hits * 5 >= len(words)
+
+
+def _needs_translation(sentence, latin_script):
+    """
+    Numbers, reference codes and English lines (e.g. inside a Hindi circular)
+    are kept as they are. Next to a non-Latin script any ASCII line is taken
+    as English; in a Latin-script language it has to read like English.
+    """
+    if not _LETTER.search(sentence):
+        return False
+    if latin_script:
+        return not _looks_english(sentence)
+    return not sentence.isascii()
+
+
+def _sentence_hash(sentence, src_lang, model_name):
+    return hashlib.sha1(f"{model_name}\0{src_lang}\0{sentence}".encode()).hexdigest()
+
+
+def translate_to_en(text: str, lang, translator=None) -> str:
+    """
+    English version of `text`. Only unique sentences are translated, in
+    batches. Sentences seen in earlier documents come from the translation
+    memory. English (or undetected) text, or a disabled/unavailable
+    translator, returns the text unchanged.
+    """
+    if not TRANSLATION_ENABLED or not lang or lang == "en" or not text.strip():
+        return text
+    if translator is None:
+        translator = get_model("translator")
+    if not translator.supports(lang):
+        log.warning("No translator for '%s' -> fallback (keep original text).", lang)
+        return text
+
+    # Keyed on the model that actually translates (the model server's, if used)
+    model_name = translator.model_name
+    parts = _TRANSLATION_SPLIT.split(text)
+    latin_script = _uses_latin_script(text)
+    hashes = {}
+    for segment in parts[::2]:
+        sentence = " ".join(segment.split())
+        if sentence not in hashes and _needs_translation(sentence, latin_script):
+            hashes[sentence] = _sentence_hash(sentence, lang, model_name)
+
+    try:
+        memory = fetch_translations(hashes.values())
+    except Exception as e:
+        log.warning("Translation memory unavailable: %s", e)
+        memory = {}
+    missing = [sentence for sentence, key in hashes.items() if key not in memory]
+    cache_requests_total.inc(len(hashes) - len(missing), cache="translation_memory", outcome="hit")
+    cache_requests_total.inc(len(missing), cache="translation_memory", outcome="miss")
+    if missing:
         try:
-            prompt = f"Which of these departments is this message suited for? [Finance, HR, Operations, Safety, Procurement, Other]:\n\n{text[:1000]}"
-            inputs = llm.flantokenizer(prompt, return_tensors="pt", truncation=True)
-            outputs = llm.flanmodel.generate(**inputs, max_length=50)
-            llm_result = llm.flantokenizer.decode(outputs[0], skip_special_tokens=True)
-            if any(cat in llm_result for cat in ["Finance", "HR", "Operations", "Safety", "Procurement", "Other"]):
-                print("   Classified using Local LLM:", llm_result)
-                return llm_result
-            else:
-                print("   LLM response unclear -> fallback.")
+            translated = translator.translate_batch(missing, lang)
+        except Exception as e:
+            log.warning("Translation failed -> fallback: %s", e)
+            return text
+        new = {hashes[sentence]: out for sentence, out in zip(missing, translated)}
+        memory.update(new)
+        try:
+            insert_translations(
+                [(key, lang, model_name, out) for key, out in new.items()],
+                datetime.utcnow().isoformat()
+            )
         except Exception as e:
-            print("   LLM classification failed -> fallback:", e)
+            log.warning("Could not update translation memory: %s", e)
+
+    for i in range(0, len(parts), 2):
+        key = hashes.get(" ".join(parts[i].split()))
+        if key:
+            parts[i] = memory[key]
+    log.debug("Translated %d unique sentences (%d from memory).", len(hashes), len(hashes) - len(missing))
+    return "".join(parts)
 
-    label = classify_with_keywords(text)
-    print("   Classified using fallback keywords:", label)
-    return label
+
+def translate_pages(pages, page_languages):
+    """
+    English text of each page. Pages are grouped by language so each language
+    is translated (and looked up in the translation memory) in one pass.
+    """
+    translated = list(pages)
+    groups = {}
+    for i, page_lang in enumerate(page_languages):
+        if page_lang and page_lang != "en" and pages[i].strip():
+            groups.setdefault(page_lang, []).append(i)
+    for page_lang, indices in groups.items():
+        # Form feeds separate the pages and survive translation unchanged
+        joined = "\f".join(pages[i].replace("\f", " ") for i in indices)
+        result = translate_to_en(joined, page_lang)
+        if result is not joined:
+            for i, text in zip(indices, result.split("\f")):
+                translated[i] = text
+    return translated
 
 
 # --- Main pipeline ---
@@ -240,49 +1048,196 @@ def classify_text(text: str, llm=None) -> str:
 #     print("\n=== Pipeline finished ===\n")
 
 
-def process_pdf(path: str):
-    print("\n=== Processing PDF:", path, "===\n")
+# Page-streaming: language and department are decided from the first pages so
+# they are available before the rest of the document has been extracted.
+EARLY_PAGES = int(os.environ.get("PRISMATA_EARLY_PAGES", "3"))
+LANGUAGE_CONFIDENCE = float(os.environ.get("PRISMATA_LANGUAGE_CONFIDENCE", "0.9"))
+# classify_text only looks at the first 1000 characters of the text
+CLASSIFY_CHARS = 1000
+PROGRESS_EVERY_PAGES = 5
+
 
-    # Step 1: Extract text
-    raw_text = extract_text_from_pdf(path)
-    print("RAW TEXT:\n", raw_text[:250], "...\n")
+def process_pdf(path: str, on_progress=None, reader=None):
+    """
+    Run the full pipeline on one PDF. If given, on_progress(stage, partial) is
+    called as each step finishes, with the derived fields computed so far.
+    `reader` is an optional PdfReader already open on the file.
 
-    # Step 2: Detect language
-    lang = detect_language(raw_text)
-    print("LANGUAGE DETECTED:", lang)
+    Pages are extracted lazily. Language is detected on the first pages until
+    langdetect is confident, and the department label as soon as the
+    classifier's input is filled (kept only if the cascade is confident, and
+    only for English text when translation is on), so both are reported
+    while later pages are still being extracted. Empty pages after the first
+    few are OCR'd together in parallel at the end.
 
-    llm = LocalLLM()
+    The result includes a "trace" with the time spent in each stage and the
+    page/token counts of this document.
+    """
+    log.info("Processing PDF: %s", path)
+    trace = Trace()
+    with trace.active():
+        result = _run_pipeline(path, on_progress, reader, trace)
+    result["trace"] = trace.finish()
+    log.info("Pipeline finished in %.2fs: %s", result["trace"]["total_seconds"], path)
+    return result
 
-    # Step 3: Translate if needed
-    # Uncomment and implement the actual translation logic as needed and as your models permit.
-    # if lang and lang != "en":
-    #     print(">> Translating to English...")
-    #     translated = llm.translate_to_en(raw_text, src_lang=lang)
-    # else:
-    #     translated = raw_text
-    translated = raw_text  # By default, no translation for now
-    print("TRANSLATED TEXT (first 300 chars):\n", translated[:300], "\n")
 
-    # Step 4: Summarization
-    print(">> Summarizing text...")
-    summary = llm.summarize(translated)
-    print("SUMMARY (first 300 chars):\n", summary[:300], "\n")
+def _run_pipeline(path, on_progress, reader, trace):
+    partial = {}
 
-    # Step 5: Classification
-    label = classify_text(translated, llm=llm)
-    print("CLASSIFICATION RESULT:", label)
+    def report(stage):
+        if on_progress:
+            on_progress(stage, dict(partial))
 
-    print("\n=== Pipeline finished ===\n")
+    llm = get_llm()
+    can_ocr = _load_ocr()
+    texts, deferred_ocr = [], []
+    lang, label = None, None
+    confidence = 0.0
+    language_decided = early_label_tried = False
+
+    # Step 1: Extract text page by page, deciding language/label early
+    pages = iter_pdf_pages(path, reader=reader)
+    while True:
+        with trace.stage("extract"):
+            page = next(pages, None)
+        if page is None:
+            break
+        page_number, txt = page
+        if not txt.strip() and can_ocr:
+            if OCR_MODE == "pages" and page_number <= EARLY_PAGES:
+                with trace.stage("ocr"):
+                    txt = _ocr_page(path, page_number)
+                trace.count("ocr_pages")
+            else:
+                deferred_ocr.append(page_number)
+        texts.append(txt)
+        partial["pages_extracted"] = page_number
+
+        sample = "\n".join(texts).strip() if page_number <= EARLY_PAGES else ""
+        if sample and not language_decided:
+            with trace.stage("detect"):
+                lang, confidence = detect_language_with_confidence(texts)
+            if confidence >= LANGUAGE_CONFIDENCE or page_number == EARLY_PAGES:
+                language_decided = True
+                partial["language"] = lang
+                partial["language_confidence"] = round(confidence, 3)
+                log.debug("Language after %d pages: %s (%.2f)", page_number, lang, confidence)
+                report("language_detected")
+        # With translation on, other languages are classified once step 3
+        # has translated them, like the summary
+        english = not TRANSLATION_ENABLED or (language_decided and lang == "en")
+        if (sample and english and not early_label_tried
+                and (len(sample) >= CLASSIFY_CHARS or page_number == EARLY_PAGES)):
+            early_label_tried = True
+            with trace.stage("classify"):
+                early_label, tier, label_confidence = classify_cascade([sample], llm=llm, batch_size=1)[0]
+            # Only a confident label stops classification early; otherwise
+            # step 4 classifies the whole document
+            if label_confidence >= CASCADE_CONFIDENCE:
+                label = early_label
+                partial["department_label"] = label
+                log.debug("Label after %d pages: %s (%s, %.2f)", page_number, label, tier, label_confidence)
+                report("classified")
+            else:
+                log.debug("Early label %s not confident (%s, %.2f) -> classifying the full text",
+                          early_label, tier, label_confidence)
+        if page_number % PROGRESS_EVERY_PAGES == 0:
+            report("extracting")
+
+    raw_text = "\n".join(texts).strip()
+    if deferred_ocr and (OCR_MODE == "pages" or not raw_text):
+        log.info("OCR on %d pages without text", len(deferred_ocr))
+        with trace.stage("ocr"):
+            for page_number, txt in ocr_pages(path, deferred_ocr).items():
+                texts[page_number - 1] = txt
+        trace.count("ocr_pages", len(deferred_ocr))
+        raw_text = "\n".join(texts).strip()
+    trace.count("pages", len(texts))
+    trace.count("chars", len(raw_text))
+    pages_total.inc(len(texts) - trace.counts.get("ocr_pages", 0), source="text")
+    pages_total.inc(trace.counts.get("ocr_pages", 0), source="ocr")
+    log.debug("Raw text: %.250s", raw_text)
+    partial["text_length"] = len(raw_text)
+    report("extracted")
+
+    # Step 2: Detect language (short documents, or no text in the first pages)
+    with trace.stage("detect"):
+        if not language_decided:
+            lang, confidence = detect_language_with_confidence(texts)
+            partial["language"] = lang
+            partial["language_confidence"] = round(confidence, 3)
+            report("language_detected")
+        page_languages = detect_page_languages(texts)
+    log.debug("Language detected: %s", lang)
+
+    # Step 3: Translate if needed, page by page so English pages of a mixed
+    # document are kept as they are. Pages whose own tag is uncertain follow
+    # the document language, if that one is confident.
+    partial["page_languages"] = [page_lang for page_lang, _ in page_languages]
+    fallback_lang = lang if confidence >= TRANSLATE_MIN_CONFIDENCE else None
+    route = [page_lang if prob >= TRANSLATE_MIN_CONFIDENCE else fallback_lang
+             for page_lang, prob in page_languages]
+    if TRANSLATION_ENABLED and any(page_lang and page_lang != "en" for page_lang in route):
+        with trace.stage("translate"):
+            translated = "\n".join(translate_pages(texts, route)).strip()
+        partial["translated"] = True
+        report("translated")
+    else:
+        translated = raw_text
+    log.debug("Translated text: %.300s", translated)
+
+    # Step 4: Classification (if the early pages did not decide it)
+    if label is None:
+        with trace.stage("classify"):
+            label = classify_text(translated, llm=llm)
+        partial["department_label"] = label
+        report("classified")
+    log.debug("Classification result: %s", label)
+
+    # Step 5: Summarization
+    with trace.stage("summarize"):
+        summary = llm.summarize(translated)
+    log.debug("Summary: %.300s", summary)
+    partial["summary"] = summary
+    report("summarized")
+
+    # Step 6: Chunk embeddings (multilingual encoder, so the original text)
+    with trace.stage("embed"):
+        embeddings = embed_text(raw_text)
+    report("embedded")
 
     return {
         "original_text": raw_text,
         "language": lang,
+        "language_confidence": round(confidence, 3),
+        "page_languages": partial["page_languages"],
         "translated_text": translated,
         "summary": summary,
-        "department_label": label
+        "department_label": label,
+        "versions": derived_field_versions(llm),
+        # numpy array (chunks x dim) for the vector index; not JSON-serializable
+        "embeddings": embeddings
     }
 
 
+if MODEL_SERVER_URL:
+    # Thin clients: the weights live in the shared model_server.py process,
+    # which reports whether it has a large classifier / translator loaded
+    register_model("llm", RemoteLLM)
+    register_model("llm_large", lambda: RemoteLLM("llm_large"))
+    register_model("embedder", RemoteEmbedder)
+    if TRANSLATION_ENABLED:
+        register_model("translator", RemoteTranslator)
+else:
+    register_model("llm", LocalLLM)
+    if LARGE_CLASSIFIER_MODEL:
+        register_model("llm_large", lambda: LocalLLM(LARGE_CLASSIFIER_MODEL))
+    register_model("embedder", LocalEmbedder)
+    if TRANSLATION_ENABLED:
+        register_model("translator", LocalTranslator)
+
+
 # --- Run directly ---
 if __name__ == "__main__":
     import argparse
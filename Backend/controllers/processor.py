@@ -1,13 +1,35 @@
 import os
-from flask import Blueprint, request, jsonify, current_app
-from datetime import datetime
-from controllers.pipeline import process_pdf  # Your modified pipeline with process_pdf returning dict
-from storage.db import insert_document
+import json
+import logging
+import mmap
+from flask import Blueprint, request, jsonify, current_app, Response
+from werkzeug.exceptions import RequestEntityTooLarge
+from controllers.jobs import submit_job, get_job, iter_job_updates, lookup_cached_result, store_cached_document
+from controllers.model_registry import model_stats
+from controllers.pipeline import PdfReader, cascade_stats
+from controllers.uploads import HashingUpload, stored_upload_path, MAX_UPLOAD_PAGES
+
+log = logging.getLogger(__name__)
 
 processor_bp = Blueprint('processor', __name__)
 
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+def open_pdf(filepath):
+    """Memory-map the stored PDF and parse it once; the reader is handed to the job."""
+    if PdfReader is None or os.path.getsize(filepath) == 0:
+        return None
+    with open(filepath, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return PdfReader(data)
+    except Exception as e:
+        # Not parseable as a PDF; let the pipeline report an empty extraction
+        log.warning("Could not parse upload as PDF: %s", e)
+        data.close()
+        return None
+
+@processor_bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({"error": e.description or "Upload too large."}), 413
 
 @processor_bp.route('/upload', methods=['POST'])
 def upload_pdf():
@@ -17,20 +39,76 @@ def upload_pdf():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     filename = file.filename
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
-
-    result = process_pdf(filepath)
-
-    insert_document(
-        file_name=filename,
-        uploaded_at=datetime.utcnow().isoformat(),
-        original_text=result.get("original_text"),
-        language=result.get("language"),
-        translated_text=result.get("translated_text"),
-        summary=result.get("summary"),
-        department_label=result.get("department_label"),
-        notes=None
-    )
-
-    return jsonify(result), 201
+
+    # The body was already streamed to a temp file and hashed while parsing
+    upload = file.stream
+    if not isinstance(upload, HashingUpload):
+        return jsonify({"error": "Unexpected upload stream."}), 500
+    content_hash = upload.hexdigest()
+
+    # Same bytes already processed by the current models: answer right away
+    cached = lookup_cached_result(content_hash)
+    if cached:
+        upload.close()
+        document_id = store_cached_document(filename, cached)
+        return jsonify({
+            "job_id": None,
+            "status": "completed",
+            "cached": True,
+            "document_id": document_id,
+            "result": cached
+        }), 200
+
+    # Stored under a content-derived name, so identical uploads share one file
+    # and different files with the same name no longer overwrite each other
+    filepath = stored_upload_path(content_hash)
+    created = upload.claim(filepath)
+
+    reader = open_pdf(filepath)
+    if reader is not None and len(reader.pages) > MAX_UPLOAD_PAGES:
+        if created:
+            os.remove(filepath)
+        return jsonify({"error": f"PDF has {len(reader.pages)} pages; the limit is {MAX_UPLOAD_PAGES}."}), 413
+
+    # Extraction and inference run in the background; poll /process/jobs/<id>
+    job_id = submit_job(filepath, filename, content_hash, reader=reader)
+
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/process/jobs/{job_id}",
+        "events_url": f"/process/jobs/{job_id}/events"
+    }), 202
+
+@processor_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job)
+
+@processor_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    # Server-Sent Events: one "progress" event per stage with the partial
+    # results so far, then a final "completed" or "failed" event
+    if not get_job(job_id):
+        return jsonify({"error": "Job not found."}), 404
+
+    def stream():
+        for job in iter_job_updates(job_id):
+            event = job["status"] if job["status"] in ("completed", "failed") else "progress"
+            yield f"event: {event}\ndata: {json.dumps(job)}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@processor_bp.route('/models', methods=['GET'])
+def loaded_models():
+    return jsonify({"models": model_stats()})
+
+@processor_bp.route('/classifier-stats', methods=['GET'])
+def classifier_stats():
+    # How many documents each cascade tier saw, decided, and the time it took
+    return jsonify({"tiers": cascade_stats.snapshot()})
@@ -0,0 +1,82 @@
+"""
+Streaming storage for uploaded PDFs.
+
+Werkzeug normally spools each multipart file part into its own temporary
+file, which the view then copies to its final location. UploadRequest
+replaces that spool with HashingUpload. The request body is written once,
+in chunks, straight into a temp file in UPLOAD_FOLDER. The SHA-256 is
+computed in the same pass and the size limit is enforced as bytes arrive.
+The view then moves the temp file to its content-addressed name.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+UPLOAD_FOLDER = 'uploads'
+MAX_UPLOAD_BYTES = int(float(os.environ.get('PRISMATA_MAX_UPLOAD_MB', '50')) * 1024 * 1024)
+MAX_UPLOAD_PAGES = int(os.environ.get('PRISMATA_MAX_UPLOAD_PAGES', '500'))
+
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+
+class HashingUpload:
+    """Write-through temp file that hashes and size-checks what it receives."""
+
+    def __init__(self, max_bytes=MAX_UPLOAD_BYTES):
+        self._file = tempfile.NamedTemporaryFile(
+            dir=UPLOAD_FOLDER, prefix='.upload-', suffix='.part', delete=False
+        )
+        self.path = self._file.name
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            # The form parser drops this object on error, so clean up here
+            self.close()
+            raise RequestEntityTooLarge(
+                f"Upload exceeds the {self.max_bytes / (1024 * 1024):g} MB limit."
+            )
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def claim(self, final_path):
+        """
+        Close the temp file and move it to final_path. If a file with that
+        (content-derived) name already exists, the duplicate is dropped.
+        Returns True if a new file was created.
+        """
+        self._file.close()
+        if os.path.exists(final_path):
+            os.remove(self.path)
+            return False
+        os.replace(self.path, final_path)
+        return True
+
+    def close(self):
+        # Unclaimed uploads (rejected or aborted requests) are removed
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # seek/read/tell etc. go to the underlying file
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingUpload()
+
+
+def stored_upload_path(content_hash):
+    return os.path.join(UPLOAD_FOLDER, f"{content_hash}.pdf")
@@ -0,0 +1,201 @@
+"""
+Bulk ingestion: load a directory, glob or zip archive of PDFs into documents.db.
+
+    python ingest.py uploads/
+    python ingest.py "archive/2023/**/*.pdf" --workers 4 --batch-size 16
+    python ingest.py circulars.zip
+
+Text extraction runs across a process pool. Language detection, summarization
+and classification run in this process on the shared, batched flan-t5 model,
+and results are written to `documents` one batch per transaction. Every
+stored file is recorded by content hash in `ingest_log`, so an interrupted
+run can simply be started again and will skip what is already loaded.
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from cli import setup_logging
+import controllers.extraction as extraction
+import controllers.pipeline as pipeline
+from controllers.pipeline import (
+    extract_text_and_page_count, detect_language, translate_to_en, summarize_and_classify_batch, embed_text,
+    derived_field_versions, EMBEDDING_MODEL
+)
+from controllers.model_registry import get_llm
+from storage.db import init_db, insert_documents, fetch_ingested_hashes
+from storage.vectors import get_vector_index
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_pdfs(sources, tmp_dir):
+    """Expand directories, globs and zip archives into (label, path) pairs."""
+    for index, source in enumerate(sources):
+        if os.path.isdir(source):
+            paths = glob.glob(os.path.join(source, '**', '*.pdf'), recursive=True)
+        elif zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                for member in archive.namelist():
+                    if member.lower().endswith('.pdf'):
+                        yield f"{source}:{member}", archive.extract(member, os.path.join(tmp_dir, str(index)))
+            continue
+        else:
+            paths = glob.glob(source, recursive=True)
+        for path in sorted(paths):
+            if path.lower().endswith('.pdf'):
+                yield path, path
+
+
+def _init_worker():
+    # The pool already uses every core; don't fan out again for OCR or page
+    # extraction (each document still gets a single extraction process)
+    pipeline.OCR_WORKERS = 1
+    extraction.EXTRACTION_WORKERS = 1
+
+
+def _extract(path):
+    """Runs in a worker process: returns (text, page_count, seconds)."""
+    start = time.perf_counter()
+    text, pages = extract_text_and_page_count(path)
+    return text, pages, time.perf_counter() - start
+
+
+class StageStats:
+    def __init__(self):
+        self.seconds = {}
+        self.docs = {}
+        self.pages = 0
+
+    def add(self, stage, seconds, docs):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.docs[stage] = self.docs.get(stage, 0) + docs
+
+    def report(self, wall_seconds, workers):
+        print("\n=== Ingest throughput ===")
+        for stage, seconds in self.seconds.items():
+            docs = self.docs[stage]
+            # Extraction time is summed over workers; divide to get wall-clock
+            effective = seconds / workers if stage == 'extract' else seconds
+            line = f"{stage:>10}: {docs} docs in {effective:.1f}s ({docs / effective if effective else 0:.2f} docs/s"
+            if stage == 'extract':
+                line += f", {self.pages / effective if effective else 0:.2f} pages/s"
+            print(line + ")")
+        total = self.docs.get('store', 0)
+        print(f"{'total':>10}: {total} docs, {self.pages} pages in {wall_seconds:.1f}s "
+              f"({total / wall_seconds if wall_seconds else 0:.2f} docs/s)")
+
+
+def process_batch(batch, stats, batch_size=pipeline.BATCH_SIZE):
+    """Detect, summarize/classify and store one batch of extracted documents."""
+    start = time.perf_counter()
+    languages = [detect_language(doc['original_text']) for doc in batch]
+    stats.add('detect', time.perf_counter() - start, len(batch))
+
+    start = time.perf_counter()
+    translated = [translate_to_en(doc['original_text'], lang) for doc, lang in zip(batch, languages)]
+    stats.add('translate', time.perf_counter() - start, len(batch))
+
+    start = time.perf_counter()
+    results = summarize_and_classify_batch(translated, batch_size=batch_size)
+    stats.add('infer', time.perf_counter() - start, len(batch))
+
+    start = time.perf_counter()
+    now = datetime.utcnow().isoformat()
+    versions = derived_field_versions(get_llm())
+    for doc, lang, text, result in zip(batch, languages, translated, results):
+        doc.update(result)
+        doc['language'] = lang
+        doc['translated_text'] = text
+        doc['uploaded_at'] = now
+        doc['versions'] = versions
+    document_ids = insert_documents(batch)
+    stats.add('store', time.perf_counter() - start, len(batch))
+
+    start = time.perf_counter()
+    index = get_vector_index()
+    for document_id, doc in zip(document_ids, batch):
+        vectors = embed_text(doc['original_text'])
+        if vectors is not None:
+            index.append(document_id, vectors, model=EMBEDDING_MODEL)
+    stats.add('embed', time.perf_counter() - start, len(batch))
+
+
+def ingest(sources, workers=None, batch_size=pipeline.BATCH_SIZE):
+    workers = workers or os.cpu_count() or 1
+    init_db()
+    done = fetch_ingested_hashes()
+    stats = StageStats()
+    wall_start = time.perf_counter()
+
+    # Load the model before extraction starts so its time is reported separately
+    start = time.perf_counter()
+    get_llm()
+    print(f">> Models ready in {time.perf_counter() - start:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        in_flight = deque()
+        batch = []
+        skipped = 0
+
+        def drain_one():
+            source, path, content_hash, future = in_flight.popleft()
+            text, pages, seconds = future.result()
+            stats.add('extract', seconds, 1)
+            stats.pages += pages
+            batch.append({
+                'file_name': os.path.basename(path),
+                'source': source,
+                'content_hash': content_hash,
+                'original_text': text,
+            })
+            if len(batch) >= batch_size:
+                process_batch(batch, stats, batch_size)
+                batch.clear()
+
+        for source, path in collect_pdfs(sources, tmp_dir):
+            content_hash = file_hash(path)
+            if content_hash in done:
+                skipped += 1
+                continue
+            done.add(content_hash)
+            in_flight.append((source, path, content_hash, pool.submit(_extract, path)))
+            # Bound the extracted-but-unprocessed backlog held in memory
+            while len(in_flight) > workers + batch_size:
+                drain_one()
+
+        while in_flight:
+            drain_one()
+        if batch:
+            process_batch(batch, stats, batch_size)
+
+    if skipped:
+        print(f"\n>> Skipped {skipped} files already ingested.")
+    stats.report(time.perf_counter() - wall_start, workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest PDFs into documents.db")
+    parser.add_argument("sources", nargs="+", help="Directories, glob patterns or .zip archives of PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=pipeline.BATCH_SIZE,
+                        help="Documents per inference batch and per database transaction")
+    args = parser.parse_args()
+    setup_logging()
+
+    ingest(args.sources, workers=args.workers, batch_size=args.batch_size)
@@ -0,0 +1,331 @@
+"""
+Shared model server: one process holds flan-t5, the sentence encoder and the
+translator, and every web worker uses it instead of loading its own copy.
+
+    python model_server.py                                  # http://127.0.0.1:8765
+    python model_server.py unix:/run/prismata/models.sock
+    PRISMATA_MODEL_SERVER_URL=unix:/run/prismata/models.sock gunicorn -w 4 'app:create_app()'
+
+The models, backend and large classifier are chosen by this server's
+PRISMATA_* settings; workers version their results (and key the result
+cache) on what it reports on /health. Translation must be enabled on both.
+
+Concurrent requests are micro-batched: each operation has a queue, and the
+first request waits up to PRISMATA_BATCH_WINDOW_MS for others to arrive
+before they run as one model batch (at most PRISMATA_MODEL_SERVER_MAX_BATCH
+items). Requests that need different settings (generation lengths, label
+sets, source language) are batched separately. Long documents are summarized
+with the usual chunked map-reduce, one document per request.
+
+Endpoints (JSON): POST /generate, /score_labels, /summarize, /summarize_batch,
+/embed, /translate; GET /health, /stats and /metrics (Prometheus text).
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from itertools import islice
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# This process serves the models, so it must load them rather than call itself
+SERVER_URL = os.environ.pop("PRISMATA_MODEL_SERVER_URL", None) or "http://127.0.0.1:8765"
+
+import numpy as np
+
+from controllers import pipeline
+from controllers.metrics import Counter, Histogram, render
+from controllers.model_client import encode_array, parse_address
+from controllers.model_registry import get_model, model_stats, preload, registered_models
+
+log = logging.getLogger("model_server")
+
+BATCH_WINDOW_MS = float(os.environ.get("PRISMATA_BATCH_WINDOW_MS", "10"))
+MAX_BATCH = int(os.environ.get("PRISMATA_MODEL_SERVER_MAX_BATCH", "32"))
+
+batch_items = Histogram("prismata_model_server_batch_items", "Items per model batch",
+                        labels=("op",), buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+batch_requests = Histogram("prismata_model_server_batch_requests", "Client requests merged into one model batch",
+                           labels=("op",), buckets=(1, 2, 4, 8, 16, 32))
+requests_total = Counter("prismata_model_server_requests_total", "Model server requests",
+                         labels=("path", "status"))
+
+
+class MicroBatcher:
+    """
+    Merges items submitted by concurrent requests into shared model calls.
+    run(items, key) must return one result per item, in order.
+    """
+
+    def __init__(self, op, run, window_seconds=BATCH_WINDOW_MS / 1000, max_items=MAX_BATCH):
+        self.op = op
+        self.run = run
+        self.window = window_seconds
+        self.max_items = max_items
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        threading.Thread(target=self._loop, name=f"batch-{op}", daemon=True).start()
+
+    def submit(self, items, key=None):
+        """Results for `items`, once the batch they joined has run."""
+        items = list(items)
+        if not items:
+            return []
+        future = Future()
+        self._queue.put((key, items, future))
+        return future.result()
+
+    def _collect(self):
+        first = self._queue.get()
+        pending, count = [first], len(first[1])
+        deadline = time.monotonic() + self.window
+        while count < self.max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(request)
+            count += len(request[1])
+        return pending
+
+    def _loop(self):
+        while True:
+            groups = {}
+            for key, items, future in self._collect():
+                groups.setdefault(key, []).append((items, future))
+            for key, requests in groups.items():
+                flat = [item for items, _ in requests for item in items]
+                batch_items.observe(len(flat), op=self.op)
+                batch_requests.observe(len(requests), op=self.op)
+                self.batches += 1
+                self.items += len(flat)
+                self.requests += len(requests)
+                try:
+                    results = self.run(flat, key)
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+                    continue
+                offset = 0
+                for items, future in requests:
+                    future.set_result(results[offset:offset + len(items)])
+                    offset += len(items)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "items": self.items,
+            "mean_batch_items": round(self.items / self.batches, 2) if self.batches else None,
+        }
+
+
+class ModelService:
+    """Routes requests to the registry's local models through the batchers."""
+
+    def __init__(self):
+        self.generate = MicroBatcher("generate", self._generate)
+        self.score = MicroBatcher("score_labels", self._score)
+        self.embed = MicroBatcher("embed", self._embed)
+        self.translate = MicroBatcher("translate", self._translate)
+
+    @staticmethod
+    def _llm(name):
+        if name not in ("llm", "llm_large") or name not in registered_models():
+            raise KeyError(f"Model '{name}' is not served")
+        return get_model(name)
+
+    # Batch runners; key carries the settings shared by the whole batch
+    def _generate(self, prompts, key):
+        name, max_length, min_length = key
+        return self._llm(name).generate_batch(prompts, max_length=max_length, min_length=min_length)
+
+    def _score(self, prompts, key):
+        name, labels = key
+        return list(self._llm(name).score_labels(prompts, list(labels)))
+
+    def _embed(self, texts, key):
+        return list(get_model("embedder").encode(texts))
+
+    def _translate(self, sentences, src_lang):
+        return get_model("translator").translate_batch(sentences, src_lang)
+
+    # Endpoints
+    def handle_generate(self, req):
+        key = (req.get("model", "llm"), int(req["max_length"]), int(req.get("min_length", 0)))
+        return {"outputs": self.generate.submit(req["prompts"], key)}
+
+    def handle_score_labels(self, req):
+        key = (req.get("model", "llm"), tuple(req["labels"]))
+        rows = self.score.submit(req["prompts"], key)
+        return {"scores": encode_array(np.reshape(rows, (len(rows), len(key[1]))))}
+
+    def handle_summarize_batch(self, req):
+        name = req.get("model", "llm")
+        llm = self._llm(name)
+        if not llm.flanmodel:
+            return {"summaries": list(req["texts"])}
+        # Same prompt and lengths as LocalLLM.summarize_batch
+        prompts = [f"summarize: {t}" for t in req["texts"]]
+        return {"summaries": self.generate.submit(prompts, (name, 300, 30))}
+
+    def handle_summarize(self, req):
+        name = req.get("model", "llm")
+        llm = self._llm(name)
+        texts = list(req["texts"])
+        summaries = [None] * len(texts)
+        short = []
+        for i, text in enumerate(texts):
+            if llm.flantokenizer and next(islice(llm.chunk_text(text), 1, None), None) is not None:
+                # Longer than one model input: map-reduce, as LocalLLM.summarize_many
+                summaries[i] = llm.summarize(text)
+            else:
+                short.append(i)
+        if short:
+            batched = self.handle_summarize_batch({"model": name, "texts": [texts[i] for i in short]})
+            for i, summary in zip(short, batched["summaries"]):
+                summaries[i] = summary
+        return {"summaries": summaries}
+
+    def handle_embed(self, req):
+        vectors = self.embed.submit(req["texts"])
+        return {"vectors": encode_array(np.reshape(vectors, (len(vectors), get_model("embedder").dim or 0)))}
+
+    def handle_translate(self, req):
+        return {"translations": self.translate.submit(req["sentences"], req["src_lang"])}
+
+    def health(self):
+        models = {}
+        for name in ("llm", "llm_large"):
+            if name in registered_models():
+                llm = get_model(name)
+                models[name] = {"loaded": llm.loaded, "model_name": llm.model_name, "backend": llm.backend}
+        embedder = get_model("embedder")
+        models["embedder"] = {"loaded": bool(embedder.model), "model": pipeline.EMBEDDING_MODEL,
+                              "dim": embedder.dim}
+        if "translator" in registered_models():
+            translator = get_model("translator")
+            languages = sorted(translator.tokenizer.lang_code_to_id) if translator.model else []
+            models["translator"] = {"loaded": bool(translator.model), "model": translator.model_name,
+                                    "languages": languages}
+        return {"status": "ok", "model_version_key": pipeline.model_version_key(), "models": models}
+
+    def stats(self):
+        return {
+            "batches": {b.op: b.stats() for b in (self.generate, self.score, self.embed, self.translate)},
+            "models": model_stats(),
+        }
+
+
+class ModelRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None
+    post_routes = {
+        "/generate": "handle_generate",
+        "/score_labels": "handle_score_labels",
+        "/summarize": "handle_summarize",
+        "/summarize_batch": "handle_summarize_batch",
+        "/embed": "handle_embed",
+        "/translate": "handle_translate",
+    }
+
+    def address_string(self):
+        # Unix socket peers have no (host, port)
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        log.debug("%s %s", self.address_string(), format % args)
+
+    def _reply(self, status, payload, content_type="application/json"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        requests_total.inc(path=self.path, status=status)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, self.service.health())
+        elif self.path == "/stats":
+            self._reply(200, self.service.stats())
+        elif self.path == "/metrics":
+            self._reply(200, render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        handler = self.post_routes.get(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if handler is None:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            self._reply(400, {"error": f"Invalid JSON: {e}"})
+            return
+        try:
+            self._reply(200, getattr(self.service, handler)(request))
+        except KeyError as e:
+            self._reply(400, {"error": f"Bad request: {e}"})
+        except Exception as e:
+            log.exception("%s failed", self.path)
+            self._reply(500, {"error": str(e)})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(url, service):
+    handler = type("Handler", (ModelRequestHandler,), {"service": service})
+    kind, address = parse_address(url)
+    if kind == "unix":
+        if os.path.exists(address):
+            os.unlink(address)  # left behind by a previous run
+        return UnixHTTPServer(address, handler)
+    server = ThreadingHTTPServer(address, handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url", nargs="?", default=SERVER_URL,
+                        help="http://host:port or unix:/path/to.sock (default: %(default)s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get("PRISMATA_LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # Load everything before accepting requests, so no client waits on a load
+    preload()
+    service = ModelService()
+    server = make_server(args.url, service)
+    log.info("Model server listening on %s (batch window %.0f ms, max %d items)",
+             args.url, BATCH_WINDOW_MS, MAX_BATCH)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        kind, address = parse_address(args.url)
+        if kind == "unix" and os.path.exists(address):
+            os.unlink(address)
+
+
+if __name__ == "__main__":
+    main()
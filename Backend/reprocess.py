@@ -0,0 +1,120 @@
+"""
+Recompute stale derived fields of stored documents from their stored text.
+
+    python reprocess.py                                  # every stale field
+    python reprocess.py --dry-run                        # count stale documents per field
+    python reprocess.py --fields summary --batch-size 16
+
+Every documents row records the version of the pipeline and models that
+produced its translated_text, summary and department_label (see
+derived_field_versions). A field is stale when that version differs from the
+current one, e.g. after bumping SUMMARY_VERSION for a new prompt, editing
+the keyword rules or switching models. Only stale fields are recomputed, and
+only from the text already in the database: PDFs are not read or OCR'd
+again. Summary and label are computed from the translation, so a new
+translation makes them stale too, and asking for either of them also
+re-translates documents whose translation is stale. Re-translation uses the
+document language (page-level tags are not stored).
+
+Documents are processed in id order, one batch per transaction. An updated
+row is no longer stale, so an interrupted run can simply be started again.
+
+Embeddings are not covered: they come from the original text, which this
+never changes, and a new embedding model needs a full re-index.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from cli import setup_logging
+import controllers.pipeline as pipeline
+from controllers.pipeline import (
+    translate_to_en, classify_texts, derived_field_versions, VERSIONED_FIELDS
+)
+from controllers.model_registry import get_llm
+from storage.db import init_db, count_stale_documents, fetch_stale_documents, update_derived_fields
+
+MODEL_FIELDS = ('summary', 'department_label')
+
+
+def recompute(docs, versions, llm, batch_size):
+    """
+    Updates for update_derived_fields(): the stale fields of each document.
+    `versions` has to include translated_text when it includes summary or
+    department_label, which are computed from an up-to-date translation.
+    """
+    updates = [{'id': doc['id'], 'versions': versions} for doc in docs]
+    texts = []
+    for doc, update in zip(docs, updates):
+        text = doc['translated_text'] or doc['original_text'] or ''
+        if 'translated_text' in versions and doc['translated_text_version'] != versions['translated_text']:
+            text = translate_to_en(doc['original_text'] or '', doc['language'])
+            update['translated_text'] = text
+        texts.append(text)
+
+    for field in MODEL_FIELDS:
+        if field not in versions:
+            continue
+        stale = [i for i, doc in enumerate(docs) if doc[f'{field}_version'] != versions[field]]
+        if not stale:
+            continue
+        if field == 'summary':
+            values = llm.summarize_many([texts[i] for i in stale], batch_size=batch_size)
+        else:
+            values = classify_texts([texts[i] for i in stale], llm=llm, batch_size=batch_size)
+        for i, value in zip(stale, values):
+            updates[i][field] = value
+    return updates
+
+
+def reprocess(fields=VERSIONED_FIELDS, batch_size=pipeline.BATCH_SIZE, limit=None, dry_run=False):
+    init_db()
+    llm = get_llm()
+    if not dry_run and set(fields) & set(MODEL_FIELDS) and not llm.loaded:
+        # Recomputing now would only replace fields with fallbacks
+        raise SystemExit("flan-t5 is not available; summaries and labels cannot be recomputed.")
+    fields = set(fields)
+    if fields & set(MODEL_FIELDS):
+        # A summary or label computed from a stale translation would be
+        # stamped with current versions and never recomputed
+        fields.add('translated_text')
+    versions = {field: version for field, version in derived_field_versions(llm).items() if field in fields}
+
+    for field, count in count_stale_documents(versions).items():
+        print(f">> {field}: {count} stale documents")
+    if dry_run:
+        return
+
+    after_id, done, start = 0, 0, time.perf_counter()
+    counts = {field: 0 for field in versions}
+    while limit is None or done < limit:
+        size = batch_size if limit is None else min(batch_size, limit - done)
+        docs = fetch_stale_documents(versions, after_id=after_id, limit=size)
+        if not docs:
+            break
+        updates = recompute(docs, versions, llm, batch_size)
+        update_derived_fields(updates, datetime.utcnow().isoformat())
+        for update in updates:
+            for field in versions:
+                counts[field] += field in update
+        after_id = docs[-1]['id']
+        done += len(docs)
+        print(f">> {done} documents reprocessed (up to id {after_id}, {time.perf_counter() - start:.1f}s)")
+
+    print(f"\n>> Done: {done} documents; recomputed " +
+          ", ".join(f"{count} {field}" for field, count in counts.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute stale derived fields from stored text")
+    parser.add_argument("--fields", nargs="+", choices=VERSIONED_FIELDS, default=list(VERSIONED_FIELDS),
+                        help="Fields to bring up to date (default: all)")
+    parser.add_argument("--batch-size", type=int, default=pipeline.BATCH_SIZE,
+                        help="Documents per inference batch and per database transaction")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many documents")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many documents are stale")
+    args = parser.parse_args()
+    setup_logging()
+
+    reprocess(args.fields, batch_size=args.batch_size, limit=args.limit, dry_run=args.dry_run)
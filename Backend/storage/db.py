@@ -1,13 +1,305 @@
 import sqlite3
 import os
+import json
+import hashlib
+import logging
+import threading
+
+from storage.textcodec import compress_text, decompress_text
 
 DB_NAME = 'documents.db'
+BUSY_TIMEOUT_MS = int(os.environ.get('PRISMATA_DB_BUSY_TIMEOUT_MS', '5000'))
+CACHE_SIZE_KB = int(os.environ.get('PRISMATA_DB_CACHE_KB', '20000'))
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+
+def _connect():
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    # WAL lets dashboard reads run while an upload is writing; NORMAL sync is
+    # durable across application crashes and much cheaper than FULL in WAL mode.
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    # Document text is stored compressed (see move_text_out_of_row)
+    conn.create_function('text_decompress', 2, decompress_text, deterministic=True)
     return conn
 
+def get_db_connection():
+    """
+    Connection reused by the calling thread. Use it as `with conn:` for a
+    transaction; the connection itself stays open for the next call.
+    """
+    key = (os.getpid(), DB_NAME)
+    # A forked child must not share its parent's connection
+    if getattr(_local, 'key', None) != key:
+        _local.conn = _connect()
+        _local.key = key
+    return _local.conn
+
+def close_db_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+        _local.key = None
+
+# Full-text index over documents. It is an external-content FTS5 table that
+# reads from a view, so text is not stored twice; the view leaves out
+# translated_text when it is just a copy of original_text. (Since migration 5
+# the view is SEARCH_SOURCE_VIEW, which decompresses the document_text blobs.) Triggers keep the
+# index in step with inserts, updates and deletes on documents.
+SEARCH_INDEX_STATEMENTS = [
+    '''
+    CREATE VIEW IF NOT EXISTS documents_search_source AS
+    SELECT id, original_text,
+           CASE WHEN translated_text = original_text THEN NULL ELSE translated_text END AS translated_text,
+           summary
+    FROM documents
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        original_text, translated_text, summary,
+        content='documents_search_source', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts (rowid, original_text, translated_text, summary)
+        SELECT id, original_text, translated_text, summary FROM documents_search_source WHERE id = new.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS documents_fts_delete BEFORE DELETE ON documents BEGIN
+        INSERT INTO documents_fts (documents_fts, rowid, original_text, translated_text, summary)
+        SELECT 'delete', id, original_text, translated_text, summary FROM documents_search_source WHERE id = old.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS documents_fts_update_before BEFORE UPDATE ON documents BEGIN
+        INSERT INTO documents_fts (documents_fts, rowid, original_text, translated_text, summary)
+        SELECT 'delete', id, original_text, translated_text, summary FROM documents_search_source WHERE id = old.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS documents_fts_update_after AFTER UPDATE ON documents BEGIN
+        INSERT INTO documents_fts (rowid, original_text, translated_text, summary)
+        SELECT id, original_text, translated_text, summary FROM documents_search_source WHERE id = new.id;
+    END
+    ''',
+]
+
+# Search source once document text lives in document_text (migration 5)
+SEARCH_SOURCE_VIEW = '''
+    CREATE VIEW IF NOT EXISTS documents_search_source AS
+    SELECT d.id,
+           text_decompress(ot.codec, ot.data) AS original_text,
+           CASE WHEN d.translated_text_hash = d.original_text_hash THEN NULL
+                ELSE text_decompress(tt.codec, tt.data) END AS translated_text,
+           d.summary
+    FROM documents d
+    LEFT JOIN document_text ot ON ot.hash = d.original_text_hash
+    LEFT JOIN document_text tt ON tt.hash = d.translated_text_hash
+'''
+SEARCH_TRIGGERS = (
+    'documents_fts_insert', 'documents_fts_delete',
+    'documents_fts_update_before', 'documents_fts_update_after'
+)
+
+def create_search_index(conn):
+    for statement in SEARCH_INDEX_STATEMENTS:
+        conn.execute(statement)
+    # Inside the migration's transaction, so not through rebuild_search_index
+    conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+def rebuild_search_index(conn=None):
+    """Re-index every existing document (e.g. after a bulk import)."""
+    conn = conn or get_db_connection()
+    with conn:
+        conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+def store_text(conn, text):
+    """
+    Store `text` in document_text (compressed, once per distinct content) and
+    return its hash, which the documents row keeps instead of the text.
+    """
+    if text is None:
+        return None
+    raw = text.encode('utf-8')
+    digest = hashlib.sha256(raw).hexdigest()
+    if conn.execute('SELECT 1 FROM document_text WHERE hash = ?', (digest,)).fetchone() is None:
+        codec, data = compress_text(raw)
+        conn.execute(
+            'INSERT OR IGNORE INTO document_text (hash, codec, data, size) VALUES (?, ?, ?, ?)',
+            (digest, codec, data, len(raw))
+        )
+    return digest
+
+TEXT_MIGRATION_BATCH = 200
+
+def move_text_out_of_row(conn):
+    """
+    Move original_text/translated_text out of the documents rows into
+    document_text. English documents, whose two columns are equal, end up
+    sharing one blob. The inline columns are left NULL. The search view is
+    switched to read the blobs and the index is rebuilt once at the end.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS document_text (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('ALTER TABLE documents ADD COLUMN original_text_hash TEXT')
+    conn.execute('ALTER TABLE documents ADD COLUMN translated_text_hash TEXT')
+
+    # Re-indexing row by row through the triggers would be wasted work
+    for trigger in SEARCH_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.execute('DROP VIEW IF EXISTS documents_search_source')
+
+    count = _move_text_columns(conn, 'documents')
+    log.info("Moved the text of %d documents into document_text.", count)
+
+    conn.execute(SEARCH_SOURCE_VIEW)
+    for statement in SEARCH_INDEX_STATEMENTS[2:]:
+        conn.execute(statement)
+    conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+
+def _move_text_columns(conn, table):
+    """
+    Store the inline original_text/translated_text of every row of `table` in
+    document_text, keep their hashes in the *_text_hash columns and clear the
+    inline columns. Returns the number of rows moved.
+    """
+    row_ids = [r[0] for r in conn.execute(
+        f'SELECT rowid FROM {table} WHERE original_text IS NOT NULL OR translated_text IS NOT NULL'
+    )]
+    for start in range(0, len(row_ids), TEXT_MIGRATION_BATCH):
+        batch = row_ids[start:start + TEXT_MIGRATION_BATCH]
+        placeholders = ','.join('?' * len(batch))
+        rows = conn.execute(
+            f'SELECT rowid AS row_id, original_text, translated_text FROM {table} WHERE rowid IN ({placeholders})',
+            batch
+        ).fetchall()
+        conn.executemany(f'''
+            UPDATE {table}
+            SET original_text_hash = ?, translated_text_hash = ?, original_text = NULL, translated_text = NULL
+            WHERE rowid = ?
+        ''', [(store_text(conn, r['original_text']), store_text(conn, r['translated_text']), r['row_id'])
+              for r in rows])
+    return len(row_ids)
+
+def move_cached_text_out_of_row(conn):
+    """Same as move_text_out_of_row for result_cache, whose rows then share the documents' blobs."""
+    conn.execute('ALTER TABLE result_cache ADD COLUMN original_text_hash TEXT')
+    conn.execute('ALTER TABLE result_cache ADD COLUMN translated_text_hash TEXT')
+    count = _move_text_columns(conn, 'result_cache')
+    log.info("Moved the text of %d cached results into document_text.", count)
+
+def delete_unreferenced_text(conn=None):
+    """Drop document_text blobs no document points at any more. Returns the count."""
+    conn = conn or get_db_connection()
+    with conn:
+        cur = conn.execute('''
+            DELETE FROM document_text WHERE hash NOT IN (
+                SELECT original_text_hash FROM documents WHERE original_text_hash IS NOT NULL
+                UNION
+                SELECT translated_text_hash FROM documents WHERE translated_text_hash IS NOT NULL
+                UNION
+                SELECT original_text_hash FROM result_cache WHERE original_text_hash IS NOT NULL
+                UNION
+                SELECT translated_text_hash FROM result_cache WHERE translated_text_hash IS NOT NULL
+            )
+        ''')
+    return cur.rowcount
+
+# Derived fields whose producing pipeline/model version is stored next to
+# them, in <field>_version (see derived_field_versions in the pipeline)
+VERSIONED_FIELDS = ('translated_text', 'summary', 'department_label')
+VERSION_COLUMNS = tuple(f'{field}_version' for field in VERSIONED_FIELDS)
+
+def add_field_versions(conn):
+    """Existing rows keep NULL versions: unknown, so reprocessing treats them as stale."""
+    for column in VERSION_COLUMNS:
+        conn.execute(f'ALTER TABLE documents ADD COLUMN {column} TEXT')
+
+def add_updated_at(conn):
+    """
+    Set when derived fields are rewritten in place (reprocess.py), which
+    changes neither the count, upload time nor ids that ETags are built from.
+    """
+    conn.execute('ALTER TABLE documents ADD COLUMN updated_at TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_documents_department_updated ON documents (department_label, updated_at)')
+
+# Schema changes applied by init_db(), in order. PRAGMA user_version records
+# how many have run, so each one is applied exactly once per database.
+MIGRATIONS = [
+    # 1: dashboard query filters on department and sorts on upload time
+    '''
+    CREATE INDEX IF NOT EXISTS idx_documents_department_uploaded
+    ON documents (department_label, uploaded_at)
+    ''',
+    # 2: full-text search over document text and summaries
+    create_search_index,
+    # 3: translation memory, so sentences repeated across circulars are
+    # translated once (key: hash of source language, model and sentence)
+    '''
+    CREATE TABLE IF NOT EXISTS translation_memory (
+        sentence_hash TEXT PRIMARY KEY,
+        source_lang TEXT NOT NULL,
+        model TEXT NOT NULL,
+        translation TEXT NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    )
+    ''',
+    # 4: per-document pipeline trace (stage timings and counts, JSON)
+    'ALTER TABLE documents ADD COLUMN trace TEXT',
+    # 5: original/translated text compressed and deduplicated in document_text
+    move_text_out_of_row,
+    # 6: version of the pipeline/models behind each derived field
+    add_field_versions,
+    # 7: cached results point at document_text instead of holding the text
+    move_cached_text_out_of_row,
+    # 8: last in-place update of a document, for ETags
+    add_updated_at,
+    # 9: cached uploads reuse the vectors of a document with the same text
+    'CREATE INDEX IF NOT EXISTS idx_documents_original_text_hash ON documents (original_text_hash)',
+]
+
+def migrate(conn):
+    """
+    Apply the pending migrations, each in its own transaction together with
+    its user_version bump: SQLite runs DDL transactionally, so a migration
+    that fails partway leaves the schema as it was and is retried next time.
+    """
+    conn.commit()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, statement in enumerate(MIGRATIONS[version:], start=version + 1):
+        # Without an explicit BEGIN, sqlite3 would run ALTER/CREATE in autocommit
+        conn.execute('BEGIN')
+        try:
+            if callable(statement):
+                statement(conn)
+            else:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        log.info("Database migrated to schema version %d.", number)
+
 def init_db():
     with get_db_connection() as conn:
         # Users table for authentication
@@ -34,7 +326,50 @@ def init_db():
                 notes TEXT
             )
         ''')
-        print("Database initialized: users and documents tables are ready.")
+
+        # Background processing jobs for /process/upload
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                file_name TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                result TEXT,
+                error TEXT,
+                document_id INTEGER,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+
+        # Processing results keyed on PDF content hash + model versions
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS result_cache (
+                content_hash TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                original_text TEXT,
+                language TEXT,
+                translated_text TEXT,
+                summary TEXT,
+                department_label TEXT,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (content_hash, model_version)
+            )
+        ''')
+
+        # Files already loaded by the bulk ingest command (for resuming)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ingest_log (
+                content_hash TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                document_id INTEGER,
+                ingested_at TEXT NOT NULL
+            )
+        ''')
+
+        migrate(conn)
+        log.info("Database initialized: users, documents, jobs, result_cache and ingest_log tables are ready.")
 
 def insert_user(username, password, department):
     with get_db_connection() as conn:
@@ -53,35 +388,365 @@ def check_user_credentials(username, password):
         user = conn.execute('SELECT * FROM users WHERE username = ? AND password = ?', (username, password)).fetchone()
     return dict(user) if user else None
 
-def insert_document(file_name, uploaded_at, original_text, language, translated_text, summary, department_label, notes=None):
+def insert_document(file_name, uploaded_at, original_text, language, translated_text, summary, department_label, notes=None, trace=None, versions=None):
+    return insert_documents([{
+        "file_name": file_name, "uploaded_at": uploaded_at, "original_text": original_text,
+        "language": language, "translated_text": translated_text, "summary": summary,
+        "department_label": department_label, "notes": notes, "trace": trace, "versions": versions
+    }])[0]
+
+def insert_documents(documents):
+    """
+    Insert many documents (dicts with the insert_document fields) in a single
+    transaction. `versions` maps derived fields to the version that produced them. Documents carrying a content_hash and source are recorded in
+    ingest_log in the same transaction. Returns the new ids in input order.
+    """
+    ids = []
     with get_db_connection() as conn:
-        conn.execute('''
-            INSERT INTO documents (
-                file_name,
-                uploaded_at,
-                original_text,
-                language,
-                translated_text,
-                summary,
-                department_label,
-                notes
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (file_name, uploaded_at, original_text, language, translated_text, summary, department_label, notes))
+        for doc in documents:
+            versions = doc.get("versions") or {}
+            cur = conn.execute('''
+                INSERT INTO documents (
+                    file_name, uploaded_at, original_text_hash, language,
+                    translated_text_hash, summary, department_label, notes, trace,
+                    translated_text_version, summary_version, department_label_version
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (doc["file_name"], doc["uploaded_at"], store_text(conn, doc.get("original_text")),
+                  doc.get("language"), store_text(conn, doc.get("translated_text")), doc.get("summary"),
+                  doc.get("department_label"), doc.get("notes"),
+                  json.dumps(doc["trace"]) if doc.get("trace") is not None else None,
+                  *(versions.get(field) for field in VERSIONED_FIELDS)))
+            ids.append(cur.lastrowid)
+            if doc.get("content_hash"):
+                conn.execute('''
+                    INSERT OR REPLACE INTO ingest_log (content_hash, source, document_id, ingested_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (doc["content_hash"], doc.get("source", doc["file_name"]), cur.lastrowid, doc["uploaded_at"]))
         conn.commit()
+    return ids
+
+# Columns that may be requested from list endpoints. The two text blobs are
+# only returned when asked for explicitly.
+DOCUMENT_FIELDS = (
+    'id', 'file_name', 'uploaded_at', 'original_text', 'language',
+    'translated_text', 'summary', 'department_label', 'notes'
+)
+LARGE_TEXT_FIELDS = ('original_text', 'translated_text')
+DEFAULT_LIST_FIELDS = tuple(f for f in DOCUMENT_FIELDS if f not in LARGE_TEXT_FIELDS)
+FULL_DOCUMENT_FIELDS = DOCUMENT_FIELDS + ('trace',) + VERSION_COLUMNS
+
+def select_documents(fields):
+    """
+    'SELECT ... FROM documents d' for the given fields. The text fields are
+    decompressed from document_text, which is only joined when they are asked for.
+    """
+    columns, joins = [], []
+    for field in fields:
+        if field == 'original_text':
+            columns.append('text_decompress(ot.codec, ot.data) AS original_text')
+            joins.append('LEFT JOIN document_text ot ON ot.hash = d.original_text_hash')
+        elif field == 'translated_text':
+            columns.append('text_decompress(tt.codec, tt.data) AS translated_text')
+            joins.append('LEFT JOIN document_text tt ON tt.hash = d.translated_text_hash')
+        else:
+            columns.append(f'd.{field}')
+    return f'SELECT {", ".join(columns)} FROM documents d ' + ' '.join(joins)
+
+def _full_document(row):
+    doc = dict(row)
+    doc["trace"] = json.loads(doc["trace"]) if doc.get("trace") else None
+    return doc
 
 def fetch_all_documents():
     with get_db_connection() as conn:
-        docs = conn.execute('SELECT * FROM documents ORDER BY uploaded_at DESC').fetchall()
-    return [dict(d) for d in docs]
+        docs = conn.execute(
+            select_documents(FULL_DOCUMENT_FIELDS) + ' ORDER BY d.uploaded_at DESC'
+        ).fetchall()
+    return [_full_document(d) for d in docs]
 
 def fetch_document_by_id(doc_id):
     with get_db_connection() as conn:
-        doc = conn.execute('SELECT * FROM documents WHERE id = ?', (doc_id,)).fetchone()
-    return dict(doc) if doc else None
+        doc = conn.execute(select_documents(FULL_DOCUMENT_FIELDS) + ' WHERE d.id = ?', (doc_id,)).fetchone()
+    return _full_document(doc) if doc else None
+
+def fetch_documents_page(department, limit, after=None, fields=DEFAULT_LIST_FIELDS):
+    """
+    One page of a department's documents, newest first. `after` is the
+    (uploaded_at, id) of the last row of the previous page (keyset pagination,
+    so deep pages cost the same as the first one).
+    """
+    columns = [f for f in DOCUMENT_FIELDS if f in fields]
+    # id and uploaded_at are needed to build the next cursor
+    for required in ('uploaded_at', 'id'):
+        if required not in columns:
+            columns.insert(0, required)
+    query = select_documents(columns) + ' WHERE d.department_label = ?'
+    params = [department]
+    if after:
+        query += ' AND (d.uploaded_at, d.id) < (?, ?)'
+        params.extend(after)
+    query += ' ORDER BY d.uploaded_at DESC, d.id DESC LIMIT ?'
+    params.append(limit)
+    with get_db_connection() as conn:
+        docs = conn.execute(query, params).fetchall()
+    return [dict(d) for d in docs]
+
+def fetch_document_ids_by_department(department):
+    with get_db_connection() as conn:
+        rows = conn.execute('SELECT id FROM documents WHERE department_label = ?', (department,)).fetchall()
+    return [r[0] for r in rows]
+
+def fetch_document_ids_with_text(text):
+    """Ids of the documents whose original text is `text`, newest first."""
+    if not text:
+        return []
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    with get_db_connection() as conn:
+        rows = conn.execute('SELECT id FROM documents WHERE original_text_hash = ? ORDER BY id DESC',
+                            (digest,)).fetchall()
+    return [r[0] for r in rows]
+
+def fetch_documents_by_ids(doc_ids, fields=DEFAULT_LIST_FIELDS):
+    """Rows for the given ids (list fields only by default), keyed by id."""
+    doc_ids = list(doc_ids)
+    if not doc_ids:
+        return {}
+    columns = [f for f in DOCUMENT_FIELDS if f in fields or f == 'id']
+    placeholders = ', '.join('?' for _ in doc_ids)
+    with get_db_connection() as conn:
+        docs = conn.execute(
+            select_documents(columns) + f' WHERE d.id IN ({placeholders})', doc_ids
+        ).fetchall()
+    return {d['id']: dict(d) for d in docs}
+
+def fetch_department_stamp(department):
+    """Cheap (index-only) summary of a department's rows, used for ETags."""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            'SELECT COUNT(*), MAX(uploaded_at), MAX(id), '
+            '(SELECT MAX(updated_at) FROM documents WHERE department_label = ?) '
+            'FROM documents WHERE department_label = ?',
+            (department, department)
+        ).fetchone()
+    return tuple(row)
 
 def fetch_documents_by_department(department):
     with get_db_connection() as conn:
         docs = conn.execute(
-            'SELECT * FROM documents WHERE department_label = ? ORDER BY uploaded_at DESC', (department,)
+            select_documents(FULL_DOCUMENT_FIELDS) + ' WHERE d.department_label = ? ORDER BY d.uploaded_at DESC',
+            (department,)
         ).fetchall()
-    return [dict(d) for d in docs]
+    return [_full_document(d) for d in docs]
+
+def _stale_condition(versions):
+    """SQL and parameters matching rows where any of `versions` differs from the stored one."""
+    fields = [f for f in VERSIONED_FIELDS if f in versions]
+    sql = ' OR '.join(f'd.{f}_version IS NOT ?' for f in fields)
+    return f'({sql})', [versions[f] for f in fields]
+
+def count_stale_documents(versions):
+    """{field: number of documents whose stored version differs from versions[field]}."""
+    with get_db_connection() as conn:
+        return {
+            field: conn.execute(
+                f'SELECT COUNT(*) FROM documents d WHERE d.{field}_version IS NOT ?', (version,)
+            ).fetchone()[0]
+            for field, version in versions.items()
+        }
+
+def fetch_stale_documents(versions, after_id=0, limit=100):
+    """
+    Documents (id order, id > after_id) with at least one field whose stored
+    version differs from `versions`; rows carry the text and version columns.
+    """
+    condition, params = _stale_condition(versions)
+    fields = ('id', 'language', 'original_text', 'translated_text') + VERSION_COLUMNS
+    with get_db_connection() as conn:
+        rows = conn.execute(
+            select_documents(fields) + f' WHERE d.id > ? AND {condition} ORDER BY d.id LIMIT ?',
+            [after_id, *params, limit]
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+def update_derived_fields(updates, updated_at):
+    """
+    Write recomputed fields in one transaction. Each update is a dict with
+    'id', some of VERSIONED_FIELDS and 'versions' ({field: version}) for them.
+    Updated rows get `updated_at`, so department ETags change.
+    """
+    with get_db_connection() as conn:
+        for update in updates:
+            assignments, params = [], []
+            for field in VERSIONED_FIELDS:
+                if field not in update:
+                    continue
+                if field == 'translated_text':
+                    assignments.append('translated_text_hash = ?')
+                    params.append(store_text(conn, update[field]))
+                else:
+                    assignments.append(f'{field} = ?')
+                    params.append(update[field])
+                assignments.append(f'{field}_version = ?')
+                params.append(update['versions'][field])
+            if assignments:
+                conn.execute(f'UPDATE documents SET {", ".join(assignments)}, updated_at = ? WHERE id = ?',
+                             [*params, updated_at, update['id']])
+        conn.commit()
+
+def insert_job(job_id, file_name, file_path, created_at):
+    with get_db_connection() as conn:
+        conn.execute('''
+            INSERT INTO jobs (id, file_name, file_path, status, created_at, updated_at)
+            VALUES (?, ?, ?, 'queued', ?, ?)
+        ''', (job_id, file_name, file_path, created_at, created_at))
+        conn.commit()
+
+def update_job(job_id, updated_at, status=None, stage=None, result=None, error=None, document_id=None):
+    """Update the given job columns; arguments left as None are not touched."""
+    fields = {
+        "status": status,
+        "stage": stage,
+        "result": json.dumps(result) if result is not None else None,
+        "error": error,
+        "document_id": document_id,
+    }
+    fields = {k: v for k, v in fields.items() if v is not None}
+    fields["updated_at"] = updated_at
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    with get_db_connection() as conn:
+        conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+        conn.commit()
+
+def fetch_job(job_id):
+    with get_db_connection() as conn:
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if not job:
+        return None
+    job = dict(job)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+def fail_unfinished_jobs(updated_at):
+    """Mark jobs left queued/running by a previous process as failed."""
+    with get_db_connection() as conn:
+        conn.execute('''
+            UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', updated_at = ?
+            WHERE status IN ('queued', 'running')
+        ''', (updated_at,))
+        conn.commit()
+
+def fetch_cached_result(content_hash, model_version):
+    with get_db_connection() as conn:
+        row = conn.execute('''
+            SELECT text_decompress(ot.codec, ot.data) AS original_text, c.language,
+                   text_decompress(tt.codec, tt.data) AS translated_text, c.summary, c.department_label
+            FROM result_cache c
+            LEFT JOIN document_text ot ON ot.hash = c.original_text_hash
+            LEFT JOIN document_text tt ON tt.hash = c.translated_text_hash
+            WHERE c.content_hash = ? AND c.model_version = ?
+        ''', (content_hash, model_version)).fetchone()
+    return dict(row) if row else None
+
+def insert_cached_result(content_hash, model_version, result, created_at):
+    """The text goes to document_text, where the document stored from the same result already put it."""
+    with get_db_connection() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO result_cache (
+                content_hash, model_version, original_text_hash, language,
+                translated_text_hash, summary, department_label, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (content_hash, model_version, store_text(conn, result.get("original_text")), result.get("language"),
+              store_text(conn, result.get("translated_text")), result.get("summary"),
+              result.get("department_label"), created_at))
+        conn.commit()
+
+def fetch_ingested_hashes():
+    with get_db_connection() as conn:
+        rows = conn.execute('SELECT content_hash FROM ingest_log').fetchall()
+    return {r["content_hash"] for r in rows}
+
+# SQLite's default limit on bound parameters is 999 in older builds
+SQL_PARAMS_PER_QUERY = 500
+
+def fetch_translations(sentence_hashes):
+    """{sentence_hash: translation} for the hashes already in translation_memory."""
+    hashes = list(sentence_hashes)
+    found = {}
+    with get_db_connection() as conn:
+        for start in range(0, len(hashes), SQL_PARAMS_PER_QUERY):
+            chunk = hashes[start:start + SQL_PARAMS_PER_QUERY]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f'SELECT sentence_hash, translation FROM translation_memory WHERE sentence_hash IN ({placeholders})',
+                chunk
+            ).fetchall()
+            found.update((r["sentence_hash"], r["translation"]) for r in rows)
+            conn.execute(
+                f'UPDATE translation_memory SET hits = hits + 1 WHERE sentence_hash IN ({placeholders})',
+                chunk
+            )
+        conn.commit()
+    return found
+
+def insert_translations(entries, created_at):
+    """Store (sentence_hash, source_lang, model, translation) tuples."""
+    with get_db_connection() as conn:
+        conn.executemany('''
+            INSERT OR IGNORE INTO translation_memory (sentence_hash, source_lang, model, translation, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(*entry, created_at) for entry in entries])
+        conn.commit()
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match (prefix on a trailing *)."""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+def search_documents(query, department=None, limit=20, offset=0):
+    """
+    Ranked full-text search (bm25, summary matches weighted highest) returning
+    metadata plus a highlighted snippet, without the large text columns.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    sql = '''
+        SELECT d.id, d.file_name, d.uploaded_at, d.language, d.summary, d.department_label,
+               snippet(documents_fts, -1, '<mark>', '</mark>', '…', 16) AS snippet,
+               bm25(documents_fts, 1.0, 1.0, 3.0) AS score
+        FROM documents_fts
+        JOIN documents d ON d.id = documents_fts.rowid
+        WHERE documents_fts MATCH ?
+    '''
+    params = [match]
+    if department:
+        sql += ' AND d.department_label = ?'
+        params.append(department)
+    sql += ' ORDER BY score LIMIT ? OFFSET ?'
+    params.extend([limit, offset])
+    with get_db_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(r) for r in rows]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Database maintenance commands")
+    parser.add_argument("command", choices=["init", "rebuild-fts", "compact"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init_db()
+    if args.command == "rebuild-fts":
+        rebuild_search_index()
+        print("Full-text search index rebuilt.")
+    elif args.command == "compact":
+        removed = delete_unreferenced_text()
+        # Return the space freed by the text migration and deletions to the OS
+        get_db_connection().execute('VACUUM')
+        print(f"Removed {removed} unreferenced text blobs and vacuumed the database.")
@@ -0,0 +1,47 @@
+"""
+Compression for document text stored in the document_text table.
+
+Blobs record the codec they were written with, so a database can mix codecs:
+switching PRISMATA_TEXT_CODEC (or installing/removing zstandard) only
+affects new text. zlib is always available; zstd is used when the
+zstandard package is installed, as it is both smaller and faster to read.
+"""
+
+import os
+import zlib
+
+# --- Optional imports ---
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TEXT_CODEC = os.environ.get('PRISMATA_TEXT_CODEC', 'zstd' if zstandard else 'zlib')
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+
+def compress_text(raw):
+    """(codec, data) for UTF-8 bytes; stored raw when compression does not help."""
+    if TEXT_CODEC == 'zstd' and zstandard:
+        codec, data = 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        codec, data = 'zlib', zlib.compress(raw, ZLIB_LEVEL)
+    if len(data) >= len(raw):
+        return 'raw', raw
+    return codec, data
+
+
+def decompress_text(codec, data):
+    """Inverse of compress_text; registered as the text_decompress() SQL function."""
+    if data is None:
+        return None
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Document text is zstd-compressed but zstandard is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == 'zlib':
+        raw = zlib.decompress(data)
+    else:
+        raw = data
+    return raw.decode('utf-8')
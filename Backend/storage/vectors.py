@@ -0,0 +1,185 @@
+"""
+Append-only vector index for semantic search, stored next to documents.db.
+
+    documents.vectors.bin   raw row-major matrix (float16 by default), one row per chunk
+    documents.vectors.ids   int64 document id for every row
+    documents.vectors.json  dtype / dimension / model of the matrix
+
+New documents are appended to the end of both files, so indexing never
+rewrites existing data. Readers np.memmap the files (no copy, pages are
+loaded on demand) and remap only when the row count has grown.
+
+Writers in any process (gunicorn workers, ingest.py) hold an exclusive lock
+on documents.vectors.lock until both files are written, so rows and ids are
+always appended in the same order; readers count rows under a shared lock.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from storage import db
+
+# --- Optional imports ---
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+VECTOR_DTYPE = os.environ.get('PRISMATA_VECTOR_DTYPE', 'float16')
+SEARCH_BLOCK_ROWS = 65536
+
+
+class VectorIndex:
+    def __init__(self, base_path, dtype=VECTOR_DTYPE):
+        self.vectors_path = base_path + '.bin'
+        self.ids_path = base_path + '.ids'
+        self.meta_path = base_path + '.json'
+        self.lock_path = base_path + '.lock'
+        self.dtype = dtype
+        self.dim = None
+        self.model = None
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._ids = None
+        self._read_meta()
+
+    def _read_meta(self):
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.dtype, self.dim, self.model = meta['dtype'], meta['dim'], meta.get('model')
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        """Lock shared by every process using the index (no-op without fcntl)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _row_count(self):
+        if not self.dim or not os.path.exists(self.vectors_path) or not os.path.exists(self.ids_path):
+            return 0
+        row_bytes = self.dim * np.dtype(self.dtype).itemsize
+        # A row only counts once both its vector and its id are on disk
+        return min(os.path.getsize(self.vectors_path) // row_bytes,
+                   os.path.getsize(self.ids_path) // 8)
+
+    def _view(self):
+        """Memory-mapped (vectors, ids), remapped if other writers appended rows."""
+        with self._lock, self._file_lock(exclusive=False):
+            # Another process may have created the index since this one opened it
+            self._read_meta()
+            rows = self._row_count()
+            if self._ids is None or len(self._ids) != rows:
+                if rows == 0:
+                    self._vectors = np.zeros((0, self.dim or 0), dtype=self.dtype)
+                    self._ids = np.zeros(0, dtype=np.int64)
+                else:
+                    self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r',
+                                              shape=(rows, self.dim))
+                    self._ids = np.memmap(self.ids_path, dtype=np.int64, mode='r', shape=(rows,))
+            return self._vectors, self._ids
+
+    def load(self):
+        """Map the index files now (zero-copy) instead of on the first search."""
+        if np is not None:
+            self._view()
+        return self
+
+    def append(self, document_id, vectors, model=None):
+        """Add the chunk vectors of one document to the end of the index."""
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if vectors.ndim != 2 or len(vectors) == 0:
+            return
+        with self._lock, self._file_lock(exclusive=True):
+            self._read_meta()
+            if self.dim is None:
+                self.dim, self.model = vectors.shape[1], model
+                with open(self.meta_path, 'w') as f:
+                    json.dump({'dtype': self.dtype, 'dim': self.dim, 'model': model}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index ({self.dim})")
+
+            # Both files are closed (flushed) before the lock is released
+            ids = np.full(len(vectors), document_id, dtype=np.int64)
+            with open(self.vectors_path, 'ab') as vf, open(self.ids_path, 'ab') as idf:
+                vf.write(vectors.tobytes())
+                idf.write(ids.tobytes())
+
+    def copy(self, source_ids, document_id):
+        """
+        Append the rows of the first of `source_ids` that is in the index
+        again under `document_id`. Returns False if none of them is.
+        """
+        if np is None:
+            return False
+        vectors, ids = self._view()
+        source_ids = list(source_ids)
+        if not source_ids or len(ids) == 0:
+            return False
+        found = set(np.unique(ids[np.isin(ids, source_ids)]).tolist())
+        source_id = next((i for i in source_ids if i in found), None)
+        if source_id is None:
+            return False
+        self.append(document_id, vectors[ids == source_id], model=self.model)
+        return True
+
+    def search(self, query, k=10, allowed_ids=None):
+        """
+        Top-k documents by cosine similarity (vectors are unit length, so a dot
+        product). A document scores as its best-matching chunk.
+        Returns [(document_id, score)], best first.
+        """
+        vectors, ids = self._view()
+        if len(ids) == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+
+        # Score in blocks so a float16 index is never upcast in one piece
+        scores = np.empty(len(ids), dtype=np.float32)
+        for start in range(0, len(ids), SEARCH_BLOCK_ROWS):
+            block = vectors[start:start + SEARCH_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        if allowed_ids is not None:
+            scores[~np.isin(ids, np.fromiter(allowed_ids, dtype=np.int64))] = -np.inf
+
+        # Look at the best few chunks first; fall back to a full sort only if
+        # they don't cover k distinct documents
+        candidates = min(len(scores), k * 16)
+        while True:
+            top = np.argpartition(-scores, candidates - 1)[:candidates]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            doc_ids, first = np.unique(ids[top], return_index=True)
+            if len(doc_ids) >= k or candidates == len(scores):
+                break
+            candidates = len(scores)
+        best = sorted(zip(first, doc_ids))[:k]
+        return [(int(doc_id), float(scores[top[i]])) for i, doc_id in best
+                if np.isfinite(scores[top[i]])]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index():
+    """Shared index for the configured database (created on first use)."""
+    global _index
+    base_path = os.path.splitext(db.DB_NAME)[0] + '.vectors'
+    with _index_lock:
+        if _index is None or _index.vectors_path != base_path + '.bin':
+            _index = VectorIndex(base_path)
+        return _index
@@ -35,7 +35,7 @@ const Dashboard = () => {
     const fetchCriticalDocs = async () => {
       if (user.department) {
         try {
-          const response = await fetch(`${API_BASE_URL}/documents/latest?department=${user.department}`);
+          const response = await fetch(`${API_BASE_URL}/documents/latest?department=${user.department}&limit=3`);
           if (response.ok) {
             const data = await response.json();
             // Assuming the API returns an object with a 'documents' key which is an array
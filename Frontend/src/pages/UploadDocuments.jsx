@@ -3,6 +3,7 @@ import { Upload, File, CheckCircle, XCircle, Clock, FileText, Brain } from 'luci
 
 // Backend API URL - adjust this to match your backend server
 const API_BASE_URL = 'http://127.0.0.1:5000';
+const JOB_POLL_INTERVAL_MS = 2000;
 
 const UploadDocuments = () => {
   const [isDragging, setIsDragging] = useState(false);
@@ -31,7 +32,49 @@ const UploadDocuments = () => {
     handleFiles(files);
   };
 
-  const uploadFileToBackend = async (file) => {
+  // Processing runs as a background job on the backend. Its progress (language
+  // and department arrive before the summary) is streamed as Server-Sent Events;
+  // plain polling is used if the event stream fails.
+  const waitForJob = (jobId, onProgress) => new Promise((resolve, reject) => {
+    const events = new EventSource(`${API_BASE_URL}/process/jobs/${jobId}/events`);
+    events.addEventListener('progress', (e) => {
+      const job = JSON.parse(e.data);
+      if (job.result && onProgress) {
+        onProgress(job.result);
+      }
+    });
+    events.addEventListener('completed', (e) => {
+      events.close();
+      resolve(JSON.parse(e.data).result);
+    });
+    events.addEventListener('failed', (e) => {
+      events.close();
+      reject(new Error(JSON.parse(e.data).error || 'Processing failed'));
+    });
+    events.onerror = () => {
+      events.close();
+      pollJob(jobId).then(resolve, reject);
+    };
+  });
+
+  const pollJob = async (jobId) => {
+    while (true) {
+      const response = await fetch(`${API_BASE_URL}/process/jobs/${jobId}`);
+      if (!response.ok) {
+        throw new Error(`Job status failed: ${response.statusText}`);
+      }
+      const job = await response.json();
+      if (job.status === 'completed') {
+        return job.result;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Processing failed');
+      }
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+  };
+
+  const uploadFileToBackend = async (file, onProgress) => {
     try {
       const formData = new FormData();
       formData.append('pdf', file);
@@ -45,7 +88,9 @@ const UploadDocuments = () => {
         throw new Error(`Upload failed: ${response.statusText}`);
       }
 
-      const result = await response.json();
+      const job = await response.json();
+      // Cached uploads come back already completed
+      const result = job.status === 'completed' ? job.result : await waitForJob(job.job_id, onProgress);
       console.log('Upload and processing successful:', result);
       return { success: true, data: result };
     } catch (error) {
@@ -79,7 +124,14 @@ const UploadDocuments = () => {
         );
 
         // Upload to backend for LLM processing
-        const result = await uploadFileToBackend(file);
+        const result = await uploadFileToBackend(file, (partial) => {
+          // Show the department as soon as it is known, before the summary
+          setUploadedFiles(prev =>
+            prev.map(f =>
+              f.id === newFile.id ? { ...f, processingResult: partial } : f
+            )
+          );
+        });
         
         if (result.success) {
           // Upload and processing successful
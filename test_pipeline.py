@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script for pipeline helpers that run without the backend server or the
+models. Run it from the repository root (python test_pipeline.py or pytest).
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend"))
+
+from controllers import extraction
+from controllers.pipeline import _central_window, sample_text, detect_page_languages
+
+class FakeEngine(extraction.ExtractionEngine):
+    """Six pages of text; pages listed in `hang_on` never finish."""
+    name = "fake"
+    hang_on = ()
+
+    @staticmethod
+    def available():
+        return True
+
+    def open(self, path):
+        return path
+
+    def page_count(self, document):
+        return 6
+
+    def page_text(self, document, page_number):
+        if page_number in self.hang_on:
+            time.sleep(3600)
+        return f"{self.name} page {page_number}"
+
+class HangingEngine(FakeEngine):
+    name = "hanging"
+    hang_on = (2, 4)
+
+class BrokenEngine(FakeEngine):
+    name = "broken"
+
+    def page_text(self, document, page_number):
+        raise ValueError("bad xref")
+
+def test_language_sample_of_sparse_pages():
+    # Scanned pages often carry only whitespace or a stray character or two
+    assert _central_window(" " * 5000, 400) == ""
+    assert _central_window("\n \f " * 1000 + "x", 400) == ""
+    assert _central_window(" " * 3000 + "ab" + " " * 3000, 400) == "ab"
+    assert _central_window("word " * 1000, 400).split() == ["word"] * 78
+
+    pages = [" " * 5000, "\n" * 3000, "Safety circular for all staff. " * 100]
+    assert "Safety" in sample_text(pages, max_chars=600)
+    assert detect_page_languages([" " * 5000])[0] == (None, 0.0)
+    print("✅ Language sampling handles pages without text")
+
+def test_extraction_timeout_falls_back():
+    # Pages 2 and 4 hang in their worker process, which has to be killed.
+    # Both fall back to the next engine, every other page comes from the
+    # first one, and nothing waits more than one timeout.
+    for engine in (FakeEngine, HangingEngine, BrokenEngine):
+        extraction.ENGINES[engine.name] = engine
+    try:
+        for workers in (1, 2):
+            start = time.perf_counter()
+            pages = extraction.extract_pages("fake.pdf", engines=["broken", "hanging", "fake"],
+                                             workers=workers, page_timeout=1)
+            elapsed = time.perf_counter() - start
+            assert [p.number for p in pages] == [1, 2, 3, 4, 5, 6]
+            assert [p.engine for p in pages] == ["hanging", "fake", "hanging", "fake", "hanging", "hanging"]
+            assert all(p.text == f"{p.engine} page {p.number}" for p in pages)
+            assert "timed out" in pages[1].error and "bad xref" in pages[1].error
+            assert elapsed < 4, elapsed
+        # Without a timeout, pages are read on the calling thread
+        pages = extraction.extract_pages("fake.pdf", engines=["broken", "fake"], page_timeout=0)
+        assert [p.engine for p in pages] == ["fake"] * 6
+        print("✅ Hanging pages fall back to the next engine; other pages keep their text")
+    finally:
+        for engine in (FakeEngine, HangingEngine, BrokenEngine):
+            extraction.ENGINES.pop(engine.name)
+
+if __name__ == "__main__":
+    print("Testing pipeline helpers...")
+    print("-" * 50)
+    test_language_sample_of_sparse_pages()
+    test_extraction_timeout_falls_back()
@@ -6,6 +6,19 @@ This tests the /process/upload endpoint that the frontend is now using.
 
 import requests
 import os
+import time
+
+def wait_for_job(job_id, timeout=600):
+    """Poll the job status endpoint until the job completes or fails"""
+    url = f"http://127.0.0.1:5000/process/jobs/{job_id}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(url).json()
+        print(f"   Status: {job.get('status')} ({job.get('stage')})")
+        if job.get("status") in ("completed", "failed"):
+            return job
+        time.sleep(2)
+    return None
 
 def test_processor_upload():
     # Backend URL for processor endpoint
@@ -44,9 +57,20 @@ def test_processor_upload():
         
         print(f"Status Code: {response.status_code}")
         
-        if response.status_code == 201:
+        if response.status_code == 202:
+            job_id = response.json()["job_id"]
+            print(f"⏳ Queued as job {job_id}, waiting for processing...")
+            job = wait_for_job(job_id)
+        elif response.status_code == 200 and response.json().get("result"):
+            # Same file processed before: the cached result comes back directly
+            print("♻️  Duplicate upload, served from the result cache")
+            job = response.json()
+        else:
+            job = None
+
+        if job and job.get("status") == "completed":
             print("✅ Upload and processing successful!")
-            result = response.json()
+            result = job["result"]
             print(f"📄 Original Text Length: {len(result.get('original_text', ''))}")
             print(f"🏢 Department: {result.get('department_label')}")
             print(f"🌐 Language: {result.get('language')}")
@@ -56,7 +80,7 @@ def test_processor_upload():
             print(result)
         else:
             print("❌ Upload failed!")
-            print(f"Response: {response.text}")
+            print(f"Response: {job or response.text}")
             
     except Exception as e:
         print(f"❌ Error: {e}")